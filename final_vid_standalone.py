@@ -1,10 +1,14 @@
 import os
 import random
+import sys
 import ffmpeg
 from datetime import datetime
 from pydub import AudioSegment
 from pathlib import Path
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "srcipts"))
+from slideshow import working_image
+
 def create_enhanced_video(image_folder, output_folder, video_duration=60):
     temp_video_path = os.path.join(output_folder, "temp_video.mp4")
     final_output_path = os.path.join(output_folder, f"final_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
@@ -33,6 +37,9 @@ def create_enhanced_video(image_folder, output_folder, video_duration=60):
 
         extended_image_files = image_files * (num_images_needed // len(image_files) + 1)
         selected_images = extended_image_files[:num_images_needed]
+        # zoompan runs on downscaled working copies (zoom tops out at 1.5 below)
+        working_images = {image: working_image(image, '1280x720', 1.5) for image in set(selected_images)}
+        selected_images = [working_images[image] for image in selected_images]
 
         # Create the video from images with fade and zoom effects
         filters = []
@@ -0,0 +1,95 @@
+import os
+import random
+import re
+import threading
+from functools import lru_cache
+import ffmpeg
+import numpy as np
+from pydub import AudioSegment
+from cache import CACHE_DIR, SqliteCache, file_key
+
+# Every instrumental is decoded once to 16-bit stereo 44.1 kHz PCM under
+# cache/beats/ and memory-mapped from then on, so picking and slicing a beat
+# is a numpy view instead of a full WAV decode.
+BEAT_SAMPLE_RATE = 44100
+BEAT_CHANNELS = 2
+BEATS_DIR = os.path.join(CACHE_DIR, "beats")
+
+@lru_cache(maxsize=None)
+def get_beat_index():
+    return SqliteCache("beat_index", max_entries=1000000)
+
+def index_beat(beat_path):
+    key = file_key(beat_path)
+    index = get_beat_index()
+    entry = index.get(key)
+    if entry and os.path.exists(entry["pcm_path"]):
+        return entry
+
+    os.makedirs(BEATS_DIR, exist_ok=True)
+    pcm_path = os.path.join(BEATS_DIR, f"{key}.pcm")
+    temp_path = f"{pcm_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    print(f"Indexing beat {beat_path}...")
+    _, stderr = (
+        ffmpeg
+        .input(beat_path)
+        .output(temp_path, format='s16le', acodec='pcm_s16le', ac=BEAT_CHANNELS, ar=BEAT_SAMPLE_RATE,
+                af='ebur128=framelog=quiet')
+        .global_args('-nostats')
+        .run(capture_stderr=True, overwrite_output=True)
+    )
+    os.replace(temp_path, pcm_path)
+
+    # ebur128 prints its summary last; take the integrated loudness from it
+    loudness = re.findall(r"I:\s+(-?[\d.]+) LUFS", stderr.decode(errors="ignore"))
+    frames = os.path.getsize(pcm_path) // (2 * BEAT_CHANNELS)
+    entry = {
+        "source_path": beat_path,
+        "pcm_path": pcm_path,
+        "frames": frames,
+        "duration": frames / BEAT_SAMPLE_RATE,
+        "sample_rate": BEAT_SAMPLE_RATE,
+        "channels": BEAT_CHANNELS,
+        "loudness": float(loudness[-1]) if loudness else None,
+    }
+    index.set(key, entry)
+    return entry
+
+def index_beat_folder(instrumental_folder):
+    beat_files = sorted(file for file in os.listdir(instrumental_folder) if file.endswith('.wav'))
+    return [index_beat(os.path.join(instrumental_folder, file)) for file in beat_files]
+
+def pick_beat(instrumental_folder):
+    beats = index_beat_folder(instrumental_folder)
+    if not beats:
+        return None
+    return random.choice(beats)
+
+def load_beat(entry):
+    samples = np.memmap(entry["pcm_path"], dtype=np.int16, mode='r')
+    return samples.reshape(-1, entry["channels"])
+
+def beat_slice(entry, start=0, duration=None):
+    samples = load_beat(entry)
+    start_frame = int(start * entry["sample_rate"])
+    end_frame = None if duration is None else start_frame + int(duration * entry["sample_rate"])
+    return samples[start_frame:end_frame]
+
+def beat_gain(entry, target_loudness, fallback_gain):
+    # Bring every beat to the same integrated loudness rather than shifting
+    # them all by a fixed amount; old-style fixed gain if loudness is unknown.
+    if entry["loudness"] is None or entry["loudness"] < -70:
+        return fallback_gain
+    return target_loudness - entry["loudness"]
+
+def beat_segment(entry, start=0, duration=None, target_loudness=None, fallback_gain=0):
+    samples = beat_slice(entry, start, duration)
+    segment = AudioSegment(
+        data=samples.tobytes(),
+        sample_width=2,
+        frame_rate=entry["sample_rate"],
+        channels=entry["channels"]
+    )
+    if target_loudness is not None:
+        segment = segment + beat_gain(entry, target_loudness, fallback_gain)
+    return segment
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# Persistent caches shared by every script, kept out of temp/ so reruns over
+# the same footage can reuse earlier results.
+CACHE_DIR = os.getenv("SNAKEMAN_CACHE_DIR", "cache")
+
+def hash_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+def file_key(path):
+    # Changes whenever the file is replaced or rewritten
+    stat = os.stat(path)
+    return hash_key(os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns))
+
+class SqliteCache:
+    def __init__(self, name, max_entries=100000, max_bytes=None, ttl=None):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL, created REAL NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(entries)")]
+        if "created" not in columns:
+            # Caption caches written before entries had a creation time
+            self.db.execute("ALTER TABLE entries ADD COLUMN created REAL NOT NULL DEFAULT 0")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.db.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] < time.time() - self.ttl:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, accessed, created) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        # Drop expired entries, then the least recently used ones until we're
+        # back under the entry and size caps
+        if self.ttl is not None:
+            self.db.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+
+        count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+        if self.max_bytes is not None:
+            total = self.db.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                for key, size in self.db.execute("SELECT key, LENGTH(value) FROM entries ORDER BY accessed").fetchall():
+                    self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+
+    def stats(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": count}
+
+class FileCache:
+    # Content-addressed files (audio, video segments...) under cache/<name>/,
+    # indexed in SQLite and evicted least recently used first once the
+    # files add up to more than max_bytes.
+    def __init__(self, name, max_bytes=2 * 1024 ** 3):
+        self.folder = os.path.join(CACHE_DIR, name)
+        os.makedirs(self.folder, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(CACHE_DIR, f"{name}.sqlite"), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed)")
+        self.db.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT filename FROM files WHERE key = ?", (key,)).fetchone()
+            path = os.path.join(self.folder, row[0]) if row else None
+            if path is None or not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE files SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return path
+
+    def put(self, key, source_path):
+        filename = key + os.path.splitext(source_path)[1]
+        path = os.path.join(self.folder, filename)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files (key, filename, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, filename, os.path.getsize(path), time.time())
+            )
+            self.evict()
+            self.db.commit()
+        return path
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, filename, size in self.db.execute("SELECT key, filename, size FROM files ORDER BY accessed").fetchall():
+            self.db.execute("DELETE FROM files WHERE key = ?", (key,))
+            try:
+                os.remove(os.path.join(self.folder, filename))
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
@@ -0,0 +1,28 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import cache
+
+class TempCacheTestCase(unittest.TestCase):
+    # Points the caches at a fresh temp folder for each test and puts the
+    # real folder back afterwards. Modules that imported CACHE_DIR by name go
+    # in cache_dir_modules; the lru_cached getters in cached_getters are
+    # cleared on both sides of the test so none stays bound to a deleted folder.
+    cache_dir_modules = ()
+    cached_getters = ()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        # Cleanups run last in, first out, so the folder goes after everything else
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        for module in (cache,) + tuple(self.cache_dir_modules):
+            patcher = mock.patch.object(module, "CACHE_DIR", self.cache_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clear_cached_getters()
+        self.addCleanup(self.clear_cached_getters)
+
+    def clear_cached_getters(self):
+        for getter in self.cached_getters:
+            getter.cache_clear()
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import shutil
+from functools import lru_cache
+from pathlib import Path
+from cache import FileCache, hash_key
+
+# Models and API clients are created on first use and shared, so importing a
+# script (or a helper from it) doesn't pay for loading BLIP or the OpenAI SDK.
+
+IMAGE_TO_TEXT_MODEL = "Salesforce/blip-image-captioning-base"
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+@lru_cache(maxsize=None)
+def get_image_to_text_model(model_name=IMAGE_TO_TEXT_MODEL):
+    from transformers import pipeline
+    print(f"Loading image-to-text model {model_name}...")
+    return pipeline("image-to-text", model=model_name)
+
+@lru_cache(maxsize=None)
+def get_tts_cache():
+    return FileCache("tts", max_bytes=TTS_CACHE_MAX_BYTES)
+
+def synthesize_speech(text, output_path, model="tts-1", voice="onyx"):
+    # Identical text/voice/model is only ever synthesised once; later calls
+    # copy the stored audio instead of going back to the API.
+    cache = get_tts_cache()
+    key = hash_key(model, voice, text)
+    cached_path = cache.get(key)
+    if cached_path:
+        shutil.copyfile(cached_path, output_path)
+        print(f"Using cached TTS audio for {output_path}")
+        return output_path
+
+    response = get_openai_client().audio.speech.create(
+        model=model,
+        voice=voice,
+        input=text
+    )
+    response.stream_to_file(Path(output_path))
+    cache.put(key, output_path)
+    return output_path
+
+def openai_chat(model, messages):
+    response = get_openai_client().chat.completions.create(messages=messages, model=model)
+    return response.choices[0].message.content
+
+def stub_chat(model, messages):
+    # Deterministic stand-in for tests and benchmarks: no network, and the
+    # same messages always give the same reply.
+    prompt = messages[-1]["content"]
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    return f"What is up sportsfans! [{model} stub {digest}] {prompt[-200:]} Follow for more boxing highlights"
+
+CHAT_BACKENDS = {
+    "openai": openai_chat,
+    "stub": stub_chat,
+}
+
+def get_chat_backend(name=None):
+    name = name or os.getenv("CHAT_BACKEND", "openai")
+    if name not in CHAT_BACKENDS:
+        raise ValueError(f"Unknown chat backend '{name}'. Choose from: {', '.join(CHAT_BACKENDS)}")
+    return name, CHAT_BACKENDS[name]
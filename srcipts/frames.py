@@ -0,0 +1,237 @@
+import math
+import os
+import ffmpeg
+import numpy as np
+from PIL import Image
+from probe import media_info
+
+# Frames are cropped to the top-left 1280x720, same as the old cv2 path
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+def get_video_size(video_path):
+    info = media_info(video_path)
+    return info["width"], info["height"]
+
+def read_raw_frames(process, width, height, channels=3):
+    frame_size = width * height * channels
+    while True:
+        data = process.stdout.read(frame_size)
+        if len(data) < frame_size:
+            break
+        frame = np.frombuffer(data, np.uint8)
+        yield frame.reshape(height, width, channels) if channels > 1 else frame.reshape(height, width)
+
+def save_frames(frames, output_folder, offset=0):
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    frame_paths = []
+    for i, frame in enumerate(frames):
+        frame_path = os.path.join(output_folder, f"frame{offset + i:05d}.jpg")
+        Image.fromarray(frame).save(frame_path, quality=95)
+        frame_paths.append(frame_path)
+    return frame_paths
+
+def frame_hash(frame, hash_size=8):
+    # Difference hash: 64 bits saying whether each pixel of a tiny greyscale
+    # thumbnail is brighter than its right-hand neighbour.
+    image = frame if isinstance(frame, Image.Image) else Image.fromarray(frame)
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hash_distance(hash_a, hash_b):
+    return (hash_a ^ hash_b).bit_count()
+
+def dedupe_frames(frames, max_distance=4):
+    # For each frame, the index of the frame whose caption it should use:
+    # itself if kept, or the last kept frame if it is within max_distance.
+    sources = []
+    last_kept, last_hash = None, None
+    for i, frame in enumerate(frames):
+        current_hash = frame_hash(frame)
+        if last_hash is not None and hash_distance(current_hash, last_hash) <= max_distance:
+            sources.append(last_kept)
+            continue
+        last_kept, last_hash = i, current_hash
+        sources.append(i)
+    return sources
+
+def open_frame_pipe(video_path, interval=1, start_time=None, duration=None, select=None):
+    # Let ffmpeg decode only the frames we keep and pipe them as raw RGB
+    # straight into numpy instead of re-encoding a trimmed copy.
+    width, height = get_video_size(video_path)
+    crop_width = min(width, FRAME_WIDTH)
+    crop_height = min(height, FRAME_HEIGHT)
+
+    input_args = {}
+    if start_time:
+        input_args['ss'] = start_time
+    if duration:
+        input_args['t'] = duration
+
+    stream = ffmpeg.input(video_path, **input_args).filter('fps', fps=f"1/{interval}")
+    if select:
+        stream = stream.filter('select', select)
+    process = (
+        stream
+        .crop(0, 0, crop_width, crop_height)
+        .output('pipe:', format='rawvideo', pix_fmt='rgb24', vsync='passthrough')
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdout=True)
+    )
+    return process, crop_width, crop_height
+
+def close_frame_pipe(process):
+    process.stdout.close()
+    if process.wait() != 0:
+        raise ffmpeg.Error('ffmpeg', None, None)
+
+def sample_frames(video_path, duration=60, interval=1, start_time=0, output_folder=None):
+    process, width, height = open_frame_pipe(video_path, interval, start_time, duration)
+    frames = list(read_raw_frames(process, width, height))
+    close_frame_pipe(process)
+
+    if output_folder:
+        save_frames(frames, output_folder)
+    return frames
+
+def window_count(video_path, window_duration=60):
+    # Windows start every window_duration over the whole seconds of the
+    # source, like range(0, int(duration), window_duration), so a fraction of
+    # a second past the last full window doesn't get a window of its own
+    return math.ceil(int(media_info(video_path)["duration"]) / window_duration)
+
+def sample_windows(video_path, window_duration=60, interval=1):
+    # One decode pass over the whole source, yielding (window_index, frames)
+    # as each window fills up so only one window is held in memory.
+    windows = window_count(video_path, window_duration)
+    if not windows:
+        return
+    process, width, height = open_frame_pipe(video_path, interval, duration=windows * window_duration)
+    frames_per_window = max(1, int(window_duration // interval))
+    window_index = 0
+    window_frames = []
+    try:
+        for frame in read_raw_frames(process, width, height):
+            if window_index == windows:
+                # Drain anything past the last window so ffmpeg exits cleanly
+                continue
+            window_frames.append(frame)
+            if len(window_frames) == frames_per_window:
+                yield window_index, window_frames
+                window_index += 1
+                window_frames = []
+        if window_frames:
+            yield window_index, window_frames
+    except GeneratorExit:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+        raise
+    close_frame_pipe(process)
+
+def motion_scores(video_path, sample_fps=4, width=64, height=36):
+    # Mean absolute difference between consecutive tiny greyscale frames,
+    # decoded at sample_fps. Cheap enough to run over the whole source.
+    process = (
+        ffmpeg
+        .input(video_path)
+        .filter('fps', fps=sample_fps)
+        .filter('scale', width, height)
+        .output('pipe:', format='rawvideo', pix_fmt='gray')
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdout=True)
+    )
+    scores = []
+    previous = None
+    for frame in read_raw_frames(process, width, height, channels=1):
+        frame = frame.astype(np.int16)
+        scores.append(float(np.abs(frame - previous).mean()) if previous is not None else 0.0)
+        previous = frame
+    close_frame_pipe(process)
+    return scores
+
+def video_fingerprint(video_path, samples=16, width=64, height=36, min_contrast=8):
+    # dHashes of about `samples` frames spread over the whole video, decoded
+    # from keyframes only and at thumbnail size so it costs a fraction of a
+    # full decode. Near-flat frames (black, fades) are skipped since they
+    # hash alike whatever the video.
+    duration = media_info(video_path)["duration"]
+    process = (
+        ffmpeg
+        .input(video_path, skip_frame='nokey')
+        .filter('fps', fps=f"{samples}/{duration}")
+        .filter('scale', width, height)
+        .output('pipe:', format='rawvideo', pix_fmt='gray')
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdout=True)
+    )
+    hashes = [frame_hash(frame) for frame in read_raw_frames(process, width, height, channels=1) if frame.std() >= min_contrast]
+    close_frame_pipe(process)
+    return hashes
+
+def fingerprint_similarity(hashes_a, hashes_b, max_distance=10):
+    # Share of frames in each fingerprint with a close match anywhere in the
+    # other, taking the lower of the two. Matching by content rather than
+    # position tolerates trims, intros and different lengths.
+    if not hashes_a or not hashes_b:
+        return 0.0
+    def matched(source, target):
+        return sum(1 for a in source if any(hash_distance(a, b) <= max_distance for b in target)) / len(source)
+    return min(matched(hashes_a, hashes_b), matched(hashes_b, hashes_a))
+
+def pick_scene_frames(scores, samples_per_window, min_frames=8, max_frames=30, threshold=10.0, min_gap=2):
+    # Per window, take the highest-scoring samples above threshold (at least
+    # min_gap samples apart), capped at max_frames, then top up with evenly
+    # spaced samples until there are min_frames.
+    windows = []
+    for window_start in range(0, len(scores), samples_per_window):
+        window_end = min(window_start + samples_per_window, len(scores))
+        candidates = sorted(
+            (i for i in range(window_start, window_end) if scores[i] >= threshold),
+            key=lambda i: scores[i], reverse=True
+        )
+        picked = []
+        for i in candidates:
+            if len(picked) >= max_frames:
+                break
+            if all(abs(i - j) >= min_gap for j in picked):
+                picked.append(i)
+
+        target = min(min_frames, window_end - window_start)
+        step = (window_end - window_start) / max(target, 1)
+        fill = [window_start + int(k * step) for k in range(target)]
+        for i in fill:
+            if len(picked) >= target:
+                break
+            if i not in picked:
+                picked.append(i)
+        windows.append(sorted(picked))
+    return windows
+
+def sample_scene_windows(video_path, window_duration=60, min_frames=8, max_frames=30, threshold=10.0, sample_fps=4):
+    # Same output as sample_windows, but each window keeps only the frames
+    # where the picture actually changes, picked from a low-res scoring pass.
+    scores = motion_scores(video_path, sample_fps=sample_fps)
+    windows = pick_scene_frames(scores, int(window_duration * sample_fps), min_frames, max_frames, threshold)
+    windows = windows[:window_count(video_path, window_duration)]
+    selected = [i for window in windows for i in window]
+    if not selected:
+        return
+
+    select = "+".join(f"eq(n,{i})" for i in selected)
+    process, width, height = open_frame_pipe(video_path, interval=1 / sample_fps, select=select)
+    frames = read_raw_frames(process, width, height)
+    try:
+        for window_index, window in enumerate(windows):
+            window_frames = [frame for _, frame in zip(window, frames)]
+            if window_frames:
+                yield window_index, window_frames
+    except GeneratorExit:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+        raise
+    close_frame_pipe(process)
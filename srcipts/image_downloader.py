@@ -1,7 +1,12 @@
 import os
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
-from time import sleep
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
 
 # Set up directories
@@ -23,8 +28,62 @@ API_KEY = os.getenv('YOUTUBE_API_KEY')
 SEARCH_ENGINE_ID = os.getenv('SEARCH_ENGINE_ID') 
 NUM_IMAGES_PER_REQUEST = 10
 
+# Images are fetched IMAGE_WORKERS at a time over one pooled session, with at
+# most PER_HOST_LIMIT requests to any one host at once
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "8"))
+PER_HOST_LIMIT = int(os.getenv("PER_HOST_LIMIT", "2"))
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+REQUEST_TIMEOUT = 20
+TARGET_SIZE = 1080
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+@lru_cache(maxsize=None)
+def get_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=IMAGE_WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+host_slots = {}
+host_slots_lock = threading.Lock()
+
+def host_slot(url):
+    host = urlparse(url).netloc
+    with host_slots_lock:
+        if host not in host_slots:
+            host_slots[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return host_slots[host]
+
+def fetch_image(image_url, target_size=TARGET_SIZE):
+    # Streams the image into memory, checks it really is one and returns it
+    # already cropped, so the only disk write is the final JPEG
+    with host_slot(image_url):
+        with get_session().get(image_url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and not content_type.startswith("image/"):
+                raise ValueError(f"not an image ({content_type})")
+            buffer = BytesIO()
+            for chunk in response.iter_content(8192):
+                buffer.write(chunk)
+                if buffer.tell() > MAX_IMAGE_BYTES:
+                    raise ValueError(f"larger than {MAX_IMAGE_BYTES} bytes")
+
+    buffer.seek(0)
+    with Image.open(buffer) as img:
+        img.verify()
+    buffer.seek(0)
+    with Image.open(buffer) as img:
+        return crop_center_image(img, target_size)
+
+
 # Function to download images using Google Custom Search API
-def download_images(query, output_dir, num_images=60):
+def download_images(query, output_dir, num_images=60, executor=None):
     os.makedirs(output_dir, exist_ok=True)
     existing_images = len(list(output_dir.glob("*.jpg")))
     num_downloaded = existing_images
@@ -34,78 +93,99 @@ def download_images(query, output_dir, num_images=60):
         print(f"Already have {num_downloaded} images for {query}. Skipping download.")
         return
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
 
-    while num_downloaded < num_images:
-        url = (
-            f"https://www.googleapis.com/customsearch/v1?q={query}&searchType=image"
-            f"&key={API_KEY}&cx={SEARCH_ENGINE_ID}&start={start}&num={NUM_IMAGES_PER_REQUEST}"
-        )
-        response = requests.get(url, headers=headers)
-        data = response.json()
-
-        if "items" not in data:
-            print(f"No more images found for {query}. Downloaded {num_downloaded} images.")
-            break
-
-        for item in data["items"]:
-            try:
-                image_url = item["link"]
-                image_response = requests.get(image_url, stream=True, headers=headers)
-                image_response.raise_for_status()
+    try:
+        while num_downloaded < num_images:
+            url = (
+                f"https://www.googleapis.com/customsearch/v1?q={query}&searchType=image"
+                f"&key={API_KEY}&cx={SEARCH_ENGINE_ID}&start={start}&num={NUM_IMAGES_PER_REQUEST}"
+            )
+            response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+            data = response.json()
+
+            if "items" not in data:
+                print(f"No more images found for {query}. Downloaded {num_downloaded} images.")
+                break
+
+            futures = {executor.submit(fetch_image, item["link"]): item["link"] for item in data["items"]}
+            for future in as_completed(futures):
+                image_url = futures[future]
+                try:
+                    image = future.result()
+                except Exception as e:
+                    print(f"Error downloading {image_url}: {e}")
+                    continue
 
                 image_path = os.path.join(output_dir, f"{query.replace(' ', '_')}_{num_downloaded + 1}.jpg")
-                with open(image_path, "wb") as file:
-                    for chunk in image_response.iter_content(8192):
-                        file.write(chunk)
-
+                image.save(image_path, "JPEG", quality=95)
                 num_downloaded += 1
                 if num_downloaded >= num_images:
+                    # Cancelled futures would raise CancelledError from
+                    # result(), and images still in flight aren't needed
+                    for pending in futures:
+                        pending.cancel()
                     break
-            except requests.exceptions.RequestException as e:
-                print(f"Error downloading {image_url}: {e}")
-                sleep(1) 
 
-        start += NUM_IMAGES_PER_REQUEST
+            start += NUM_IMAGES_PER_REQUEST
+    finally:
+        if own_executor:
+            executor.shutdown()
 
     print(f"Downloaded {num_downloaded} images for {query}.")
 
 
-def crop_center(image_path, target_size=1080):
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            new_width = new_height = min(width, height)
+def crop_center_image(img, target_size=TARGET_SIZE):
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    width, height = img.size
+    new_width = new_height = min(width, height)
 
-            left = (width - new_width) / 2
-            top = (height - new_height) / 2
-            right = (width + new_width) / 2
-            bottom = (height + new_height) / 2
-            cropped_image = img.crop((left, top, right, bottom))
-            cropped_image = cropped_image.resize((target_size, target_size))
+    left = (width - new_width) / 2
+    top = (height - new_height) / 2
+    right = (width + new_width) / 2
+    bottom = (height + new_height) / 2
+    cropped_image = img.crop((left, top, right, bottom))
+    return cropped_image.resize((target_size, target_size))
 
-    
-            if cropped_image.mode == 'RGBA':
-                cropped_image = cropped_image.convert('RGB')
 
-            cropped_image.save(image_path)
+def crop_center(image_path, target_size=TARGET_SIZE):
+    # For images saved by older runs before they were cropped on download
+    try:
+        with Image.open(image_path) as img:
+            if img.size == (target_size, target_size):
+                return
+            cropped_image = crop_center_image(img, target_size)
+        cropped_image.save(image_path)
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
 
 
-def process_images_for_boxers(boxers):
-    for boxer, keywords in boxers:
-        boxer_name = boxer.lower().replace(" ", "_")
-        boxer_dir = IMAGES_DIR / boxer_name
+def process_boxer(boxer, keywords, executor):
+    boxer_name = boxer.lower().replace(" ", "_")
+    boxer_dir = IMAGES_DIR / boxer_name
+
+    if not boxer_dir.exists() or len(list(boxer_dir.glob("*.jpg"))) < 60:
+        download_images(keywords, boxer_dir, executor=executor)
 
-        if not boxer_dir.exists() or len(list(boxer_dir.glob("*.jpg"))) < 60:
-            download_images(keywords, boxer_dir)
+    for image_file in boxer_dir.glob("*.jpg"):
+        crop_center(image_file)
+    print(f"Processed images for {boxer}")
 
-        for image_file in boxer_dir.glob("*.jpg"):
-            crop_center(image_file)
-        print(f"Processed images for {boxer}")
+
+def process_images_for_boxers(boxers):
+    # Every boxer's search pages are walked at once; their image fetches share
+    # one pool, so the per-host limits hold across all of them
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as image_executor:
+        with ThreadPoolExecutor(max_workers=max(1, len(boxers))) as boxer_executor:
+            futures = {boxer_executor.submit(process_boxer, boxer, keywords, image_executor): boxer for boxer, keywords in boxers}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error processing images for {futures[future]}: {e}")
 
 
 if __name__ == "__main__":
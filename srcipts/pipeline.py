@@ -0,0 +1,138 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Each stage is (name, fn, workers). fn takes an item and returns the item
+# for the next stage. Stages are joined by bounded queues, so at most
+# queue_size items wait between two stages and memory stays flat however
+# many items the source yields.
+
+STOP = object()
+
+def run_stages(items, stages, queue_size=2):
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    remaining = [workers for _, _, workers in stages]
+    lock = threading.Lock()
+    errors = []
+
+    def worker(index):
+        name, fn, _ = stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = inbox.get()
+            if item is STOP:
+                break
+            if errors:
+                # Something failed: keep draining so nobody blocks on a full queue
+                continue
+            try:
+                result = fn(item)
+            except Exception as e:
+                print(f"Error in {name} stage: {e}")
+                errors.append(e)
+                continue
+            if outbox is not None:
+                outbox.put(result)
+
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last and outbox is not None:
+            for _ in range(stages[index + 1][2]):
+                outbox.put(STOP)
+
+    threads = []
+    for index, (name, _, workers) in enumerate(stages):
+        for i in range(workers):
+            thread = threading.Thread(target=worker, args=(index,), name=f"{name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    try:
+        for item in items:
+            if errors:
+                break
+            queues[0].put(item)
+    finally:
+        for _ in range(stages[0][2]):
+            queues[0].put(STOP)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+class ClipCounter:
+    def __init__(self, count, target):
+        self.count = count
+        self.target = target
+        self.lock = threading.Lock()
+
+    def add(self, clips):
+        with self.lock:
+            self.count += clips
+            return self.count
+
+    def reached(self):
+        with self.lock:
+            return self.count >= self.target
+
+class ByteBudget:
+    # Caps the bytes held by items between stages. A worker reserves an
+    # estimate before it starts writing, waiting for room under the same lock
+    # so several workers can't all slip under the cap at once, then swaps
+    # the estimate for the real size once it's known.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def reserve(self, size):
+        with self.condition:
+            # An item bigger than the whole budget still goes through on its own
+            while self.used > 0 and self.used + size > self.max_bytes:
+                self.condition.wait()
+            self.used += size
+
+    def adjust(self, reserved, size):
+        with self.condition:
+            self.used += size - reserved
+            self.condition.notify_all()
+
+    def release(self, size):
+        self.adjust(size, 0)
+
+def timed_call(fn, item, *args):
+    start = time.perf_counter()
+    detail = fn(item, *args)
+    return detail, time.perf_counter() - start
+
+def run_in_processes(fn, items, workers, *args):
+    # Yields (item, result) as each item finishes in a pool of spawned
+    # processes; fn(item, *args) returns a short detail string for the summary.
+    # Spawn rather than fork so every worker loads its own models from scratch.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(timed_call, fn, item, *args): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                detail, seconds = future.result()
+                result = {"file": item, "status": "ok", "detail": detail, "seconds": seconds}
+            except Exception as e:
+                print(f"Skipping {item} due to error: {e}")
+                result = {"file": item, "status": "failed", "detail": str(e)}
+            yield item, result
+
+def print_file_summary(results):
+    if not results:
+        return
+    print("Summary:")
+    for result in sorted(results, key=lambda result: result["file"]):
+        seconds = f" in {result['seconds']:.0f}s" if "seconds" in result else ""
+        print(f"  [{result['status']}] {result['file']}{seconds}: {result['detail']}")
+    failed = sum(1 for result in results if result["status"] != "ok")
+    print(f"{len(results) - failed} of {len(results)} files processed, {failed} failed")
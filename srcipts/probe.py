@@ -0,0 +1,46 @@
+import os
+from functools import lru_cache
+import ffmpeg
+from cache import SqliteCache, file_key
+
+# ffprobe output for every file any script has looked at, keyed on the file's
+# path, size and mtime, so asking again about an unchanged file is a SQLite
+# lookup instead of a new ffprobe process.
+PROBE_CACHE_MAX_ENTRIES = int(os.getenv("PROBE_CACHE_MAX_ENTRIES", "100000"))
+
+@lru_cache(maxsize=None)
+def get_probe_cache():
+    return SqliteCache("probe", max_entries=PROBE_CACHE_MAX_ENTRIES)
+
+def probe_media(path):
+    cache = get_probe_cache()
+    key = file_key(path)
+    probe = cache.get(key)
+    if probe is None:
+        probe = ffmpeg.probe(path)
+        cache.set(key, probe)
+    return probe
+
+def parse_rate(rate):
+    numerator, _, denominator = rate.partition('/')
+    if not denominator:
+        return float(numerator)
+    return float(numerator) / float(denominator) if float(denominator) else None
+
+def media_info(path):
+    probe = probe_media(path)
+    streams = probe.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), None)
+    return {
+        "duration": float(probe['format']['duration']),
+        "streams": streams,
+        "width": int(video['width']) if video else None,
+        "height": int(video['height']) if video else None,
+        "fps": parse_rate(video['avg_frame_rate']) if video and video.get('avg_frame_rate') else None,
+        "sample_rate": int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+        "channels": int(audio['channels']) if audio and audio.get('channels') else None,
+    }
+
+def media_duration(path):
+    return media_info(path)["duration"]
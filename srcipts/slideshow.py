@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import threading
+import ffmpeg
+from PIL import Image, ImageOps
+from cache import FileCache, hash_key
+from probe import media_duration, media_info
+
+# Image slideshow with a slow zoom on every image, shared by stand.py and
+# warhammer.py. Every segment is encoded with the same settings so the
+# segments can be joined by the concat demuxer without a second encode.
+SEGMENT_FPS = 25
+SEGMENT_SIZE = '1280x720'
+SEGMENT_ZOOM = 'min(zoom+0.00075,1.5)'
+SEGMENT_ENCODE = {'vcodec': 'libx264', 'pix_fmt': 'yuv420p', 'r': SEGMENT_FPS}
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", "4"))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+SEGMENT_MAX_ZOOM = 1.5
+# Source images are downscaled to just cover the output at full zoom before
+# zoompan sees them; anything bigger only costs time per output frame
+WORKING_IMAGE_QUALITY = 95
+WORKING_IMAGE_CACHE_MAX_BYTES = int(os.getenv("WORKING_IMAGE_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+@lru_cache(maxsize=None)
+def get_segment_cache():
+    return FileCache("segments", max_bytes=SEGMENT_CACHE_MAX_BYTES)
+
+@lru_cache(maxsize=None)
+def get_working_image_cache():
+    return FileCache("working_images", max_bytes=WORKING_IMAGE_CACHE_MAX_BYTES)
+
+def image_hash(image_path):
+    with open(image_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def working_size(width, height, output_size=SEGMENT_SIZE, max_zoom=SEGMENT_MAX_ZOOM):
+    # Smallest aspect-preserving size whose crop at max_zoom still covers the
+    # output; never upscales
+    output_width, output_height = (int(value) for value in output_size.split('x'))
+    scale = min(1, max(output_width * max_zoom / width, output_height * max_zoom / height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def working_image(image_path, output_size=SEGMENT_SIZE, max_zoom=SEGMENT_MAX_ZOOM, content_hash=None):
+    # EXIF-rotated, RGB, downscaled copy of the image, made once per source
+    cache = get_working_image_cache()
+    key = hash_key(content_hash or image_hash(image_path), output_size, repr(float(max_zoom)), str(WORKING_IMAGE_QUALITY))
+    cached_path = cache.get(key)
+    if cached_path:
+        return cached_path
+
+    with Image.open(image_path) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        size = working_size(image.width, image.height, output_size, max_zoom)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+        temp_path = os.path.join(cache.folder, f"{key}.{os.getpid()}.{threading.get_ident()}.jpg")
+        image.save(temp_path, quality=WORKING_IMAGE_QUALITY)
+    try:
+        return cache.put(key, temp_path)
+    finally:
+        os.remove(temp_path)
+
+def segment_key(content_hash, duration):
+    # Anything that changes the rendered pixels has to be part of the key
+    return hash_key(content_hash, repr(float(duration)), SEGMENT_SIZE, SEGMENT_ZOOM, json.dumps(SEGMENT_ENCODE, sort_keys=True),
+                    repr(float(SEGMENT_MAX_ZOOM)), str(WORKING_IMAGE_QUALITY))
+
+def get_audio_duration(audio_path):
+    return media_duration(audio_path)
+
+def create_video_segment(image_path, output_path, duration=30):
+    try:
+        (
+            ffmpeg
+            .input(working_image(image_path), loop=1, t=duration)
+            .filter('zoompan', z=SEGMENT_ZOOM, d=duration * SEGMENT_FPS + 100, s=SEGMENT_SIZE)
+            .filter('format', pix_fmts='yuv420p')
+            .filter('fade', t='in', st=0, d=1)
+            .filter('fade', t='out', st=duration-1, d=1)
+            .output(output_path, t=duration, **SEGMENT_ENCODE)
+            .run(overwrite_output=True, quiet=True)
+        )
+    except ffmpeg.Error as e:
+        print(f"ffmpeg error rendering {image_path}: {e.stderr.decode(errors='ignore')}")
+        raise
+    print(f"Rendered segment {output_path}")
+
+def render_cached_segment(key, job):
+    image_path, output_path, duration = job
+    cache = get_segment_cache()
+    cached_path = cache.get(key)
+    if cached_path:
+        print(f"Using cached segment for {image_path} ({duration}s)")
+        return cached_path
+    create_video_segment(image_path, output_path, duration)
+    cached_path = cache.put(key, output_path)
+    os.remove(output_path)
+    return cached_path
+
+def render_segments(jobs, workers=SEGMENT_WORKERS, use_cache=True):
+    # jobs are (image_path, output_path, duration); each one is its own ffmpeg
+    # process, so threads are enough to keep several running at once
+    get_working_image_cache()
+    if not use_cache:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda job: create_video_segment(*job), jobs))
+        return [output_path for _, output_path, _ in jobs]
+
+    # Repeated images with the same duration are rendered once (or not at all
+    # if an earlier run already did) and the concat list points every repeat
+    # at the same cached file
+    content_hashes = {}
+    keys = []
+    unique_jobs = {}
+    for job in jobs:
+        image_path, _, duration = job
+        if image_path not in content_hashes:
+            content_hashes[image_path] = image_hash(image_path)
+        key = segment_key(content_hashes[image_path], duration)
+        keys.append(key)
+        unique_jobs.setdefault(key, job)
+
+    get_segment_cache()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = dict(zip(unique_jobs, executor.map(lambda item: render_cached_segment(*item), unique_jobs.items())))
+    print(f"Rendered {len(unique_jobs)} unique segments for {len(jobs)} slots")
+    return [paths[key] for key in keys]
+
+def concatenate_segments(segment_paths, output_path, audio_path=None):
+    # Segments are copied as-is; only the audio is encoded here
+    filelist_path = f"{output_path}.txt"
+    with open(filelist_path, 'w') as f:
+        for segment_path in segment_paths:
+            f.write(f"file '{os.path.abspath(segment_path)}'\n")
+    video = ffmpeg.input(filelist_path, format='concat', safe=0).video
+
+    if audio_path:
+        audio = ffmpeg.input(audio_path)
+        audio_info = media_info(audio_path)
+        audio_duration = audio_info["duration"]
+        final_audio_duration = audio_duration + 10  # Add 10 seconds of silence at the end
+        audio = (
+            audio
+            .filter('atrim', end=audio_duration)
+            .filter('apad', pad_len=10 * (audio_info["sample_rate"] or 44100))
+            .filter('atrim', end=final_audio_duration)
+        )
+        output = ffmpeg.output(video, audio, output_path, vcodec='copy', acodec='aac')
+    else:
+        output = ffmpeg.output(video, output_path, vcodec='copy')
+
+    try:
+        output.run(overwrite_output=True)
+    finally:
+        os.remove(filelist_path)
+
+def create_enhanced_video(image_folder, output_folder, audio_file=None):
+    temp_video_folder = os.path.join(output_folder, "temp_segments")
+    if not os.path.exists(temp_video_folder):
+        os.makedirs(temp_video_folder)
+
+    final_output_path = os.path.join(output_folder, f"final_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+
+    image_files = [os.path.join(image_folder, file) for file in os.listdir(image_folder) if file.endswith(('.png', '.jpg', '.jpeg'))]
+
+    if not image_files:
+        print("No image files found in the specified folder. Exiting...")
+        return
+
+    if audio_file:
+        video_duration = get_audio_duration(audio_file) + 10  # Audio duration plus 10 seconds of silence
+    else:
+        video_duration = 60  # Default video duration if no audio file is provided
+
+    # Calculate the number of images needed and the display duration for each
+    image_display_time = 30  # Display each image for 30 seconds
+    num_images_needed = int(video_duration // image_display_time)
+    remaining_time = video_duration % image_display_time
+
+    extended_image_files = image_files * (num_images_needed // len(image_files) + 1)
+    selected_images = extended_image_files[:num_images_needed]
+
+    jobs = []
+    for i, image in enumerate(selected_images):
+        jobs.append((image, os.path.join(temp_video_folder, f"segment_{i}.mp4"), image_display_time))
+
+    if remaining_time > 0:
+        last_image = selected_images[-1] if selected_images else image_files[0]
+        jobs.append((last_image, os.path.join(temp_video_folder, f"segment_{num_images_needed}.mp4"), remaining_time))
+
+    segment_paths = render_segments(jobs)
+    concatenate_segments(segment_paths, final_output_path, audio_file)
+    print(f"Final video saved to {final_output_path}")
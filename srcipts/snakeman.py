@@ -1,21 +1,49 @@
+import json
 import os
-import random
 import shutil
-import cv2
+import sys
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache
 from PIL import Image
-from pathlib import Path
 import ffmpeg
 from pydub import AudioSegment
-from transformers import pipeline
-from openai import OpenAI
+from beats import beat_gain, beat_segment, pick_beat
+from cache import SqliteCache, hash_key
+from clients import IMAGE_TO_TEXT_MODEL, get_chat_backend, get_image_to_text_model, synthesize_speech
+from frames import dedupe_frames, sample_frames, sample_scene_windows, sample_windows
+from pipeline import print_file_summary, run_in_processes, run_stages
+from probe import media_duration
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-image_to_text_model = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
-
 TEMP_DIR = "temp"
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "8"))
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+CAPTION_SETTINGS = {"max_new_tokens": 50}
+CAPTION_CACHE_MAX_ENTRIES = int(os.getenv("CAPTION_CACHE_MAX_ENTRIES", "200000"))
+FRAME_DEDUPE_DISTANCE = int(os.getenv("FRAME_DEDUPE_DISTANCE", "4"))
+SUMMARY_MODEL = "gpt-4o"
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "20000"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(50 * 1024 ** 2)))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", str(30 * 24 * 3600)))
+PIPELINED = os.getenv("SNAKEMAN_PIPELINE", "1") == "1"
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+CAPTION_WORKERS = int(os.getenv("CAPTION_WORKERS", "1"))
+NARRATE_WORKERS = int(os.getenv("NARRATE_WORKERS", "2"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "1"))
+VIDEO_LOCK = threading.Lock()
+# "interval" keeps one frame per second, "scene" keeps frames where the picture changes
+FRAME_SAMPLING = os.getenv("FRAME_SAMPLING", "interval")
+SCENE_MIN_FRAMES = int(os.getenv("SCENE_MIN_FRAMES", "8"))
+SCENE_MAX_FRAMES = int(os.getenv("SCENE_MAX_FRAMES", "30"))
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", "10"))
+# "graph" mixes and encodes in one ffmpeg run, "legacy" mixes in pydub and encodes twice
+RENDER_MODE = os.getenv("RENDER_MODE", "graph")
+# Integrated loudness (LUFS) the beat is brought to under the narration
+BEAT_LOUDNESS = float(os.getenv("BEAT_LOUDNESS", "-20"))
+IRRELEVANT_TERMS = ["background", "flower", "standing next to", "lion", "wrestling", "flag", "wrestling ring", "white shirt"]
 
 def cleanup_folder(folder, exclude=[]):
     if os.path.exists(folder):
@@ -26,37 +54,104 @@ def cleanup_folder(folder, exclude=[]):
     else:
         os.makedirs(folder)
 
-def extract_frames(video_path, output_folder, duration=60, interval=1, start_time=0):
+def extract_frames(video_path, output_folder=None, duration=60, interval=1, start_time=0):
     print(f"Extracting frames from {start_time} seconds...")
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+    frames = sample_frames(video_path, duration=duration, interval=interval, start_time=start_time, output_folder=output_folder)
+    if output_folder:
+        print(f"Extracted {len(frames)} frames to {output_folder}")
+    else:
+        print(f"Extracted {len(frames)} frames")
+    return frames
+
+def iter_windows(video_path, window_duration=60, interval=1, single_pass=True, sampling=FRAME_SAMPLING):
+    if sampling == "scene":
+        print("Extracting scene-change frames for all windows...")
+        for window_index, frames in sample_scene_windows(
+            video_path, window_duration=window_duration,
+            min_frames=SCENE_MIN_FRAMES, max_frames=SCENE_MAX_FRAMES, threshold=SCENE_THRESHOLD
+        ):
+            print(f"Window {window_index}: kept {len(frames)} scene-change frames")
+            yield window_index * window_duration, frames
+        return
 
-    trimmed_video_path = os.path.join(output_folder, os.path.basename(video_path))
-    (
-        ffmpeg
-        .input(video_path, ss=start_time, t=duration)
-        .output(trimmed_video_path, vcodec='libx264', pix_fmt='yuv420p')
-        .run()
-    )
+    if single_pass:
+        print("Extracting frames for all windows in one pass...")
+        for window_index, frames in sample_windows(video_path, window_duration=window_duration, interval=interval):
+            yield window_index * window_duration, frames
+        return
 
-    cap = cv2.VideoCapture(trimmed_video_path)
-    frame_count = 0
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    interval_frames = int(fps * interval)
-
-    success, image = cap.read()
-    while success:
-        if frame_count % interval_frames == 0:
-            frame_filename = os.path.join(output_folder, f"frame{frame_count}.jpg")
-            cropped_image = image[:720, :1280]   
-            cv2.imwrite(frame_filename, cropped_image)
-        success, image = cap.read()
-        frame_count += 1
-    cap.release()
-    print(f"Extracted frames to {output_folder}")
-    os.remove(trimmed_video_path)
-
-def generate_descriptions(frames_folder, user_description, video_name):
+    video_duration = int(media_duration(video_path))
+    for start_time in range(0, video_duration, window_duration):
+        yield start_time, extract_frames(video_path, duration=window_duration, interval=interval, start_time=start_time)
+
+def to_image(frame):
+    if isinstance(frame, Image.Image):
+        return frame.convert("RGB")
+    return Image.fromarray(frame)
+
+@lru_cache(maxsize=None)
+def get_caption_cache():
+    return SqliteCache("captions", max_entries=CAPTION_CACHE_MAX_ENTRIES)
+
+def caption_cache_key(image):
+    settings = json.dumps(CAPTION_SETTINGS, sort_keys=True)
+    return hash_key(IMAGE_TO_TEXT_MODEL, settings, f"{image.mode}{image.size}", image.tobytes())
+
+def run_image_to_text(images, batch_size=CAPTION_BATCH_SIZE, num_threads=TORCH_THREADS):
+    import torch
+
+    image_to_text_model = get_image_to_text_model()
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        outputs = image_to_text_model(images, batch_size=batch_size, **CAPTION_SETTINGS)
+    elapsed = time.perf_counter() - start
+
+    captions = [output[0]['generated_text'] for output in outputs]
+    if captions:
+        print(f"Captioned {len(captions)} frames in {elapsed:.1f}s "
+              f"({len(captions) / elapsed:.2f} frames/s, batch size {batch_size}, {torch.get_num_threads()} threads)")
+    return captions
+
+def caption_frames(frames, batch_size=CAPTION_BATCH_SIZE, num_threads=TORCH_THREADS, use_cache=True,
+                   dedupe_distance=FRAME_DEDUPE_DISTANCE):
+    images = [to_image(frame) for frame in frames]
+
+    # Near-static stretches reuse the caption of the last kept frame
+    sources = dedupe_frames(images, dedupe_distance) if dedupe_distance > 0 else list(range(len(images)))
+    kept = sorted(set(sources))
+    dropped = len(images) - len(kept)
+
+    cache = get_caption_cache() if use_cache else None
+    keys = {i: caption_cache_key(images[i]) for i in kept} if use_cache else {}
+    kept_captions = {i: cache.get(keys[i]) if use_cache else None for i in kept}
+    missing = [i for i in kept if kept_captions[i] is None]
+
+    seconds_per_frame = None
+    if missing:
+        start = time.perf_counter()
+        new_captions = run_image_to_text([images[i] for i in missing], batch_size, num_threads)
+        seconds_per_frame = (time.perf_counter() - start) / len(missing)
+        for i, caption in zip(missing, new_captions):
+            kept_captions[i] = caption
+            if use_cache:
+                cache.set(keys[i], caption)
+
+    if dropped:
+        saved = f", ~{dropped * seconds_per_frame:.1f}s of model time saved" if seconds_per_frame else ""
+        print(f"Dropped {dropped} of {len(images)} near-duplicate frames{saved}")
+
+    if not use_cache:
+        return [kept_captions[source] for source in sources]
+
+    stats = cache.stats()
+    print(f"Caption cache: {len(kept) - len(missing)} hits, {len(missing)} misses this window "
+          f"({stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries overall)")
+    return [kept_captions[source] for source in sources]
+
+def generate_descriptions(frames, user_description, video_name, batch_size=CAPTION_BATCH_SIZE):
     print("Generating descriptions for frames...")
     descriptions = []
     custom_image_prompt = "Describe the key elements in each frame, focusing on the main actions and subjects. Avoid irrelevant details like the background or clothing unless necessary for context. Describe each frame as part of a continuous sequence of events."
@@ -66,18 +161,23 @@ def generate_descriptions(frames_folder, user_description, video_name):
         f"{custom_image_prompt}"
     )
 
-    for frame in sorted(os.listdir(frames_folder)):
-        frame_path = os.path.join(frames_folder, frame)
-        image = Image.open(frame_path)
-        prompt = f"{context[:500]}\nFrame description:"  
-        description = image_to_text_model(image, max_new_tokens=50)[0]['generated_text']
-        if not any(irrelevant in description for irrelevant in ["background", "flower", "standing next to", "lion", "wrestling", "flag", "wrestling ring", "white shirt"]):
+    for description in caption_frames(frames, batch_size=batch_size):
+        if not any(irrelevant in description for irrelevant in IRRELEVANT_TERMS):
             descriptions.append(description)
         context += f" {description}"
 
     return descriptions
 
-def summarize_descriptions(descriptions, user_description="", video_name="", duration=60):
+def benchmark_captioning(video_path, batch_sizes=(1, 2, 4, 8, 16), duration=60):
+    frames = extract_frames(video_path, duration=duration, interval=1)
+    for batch_size in batch_sizes:
+        caption_frames(frames, batch_size=batch_size, use_cache=False, dedupe_distance=0)
+
+@lru_cache(maxsize=None)
+def get_summary_cache():
+    return SqliteCache("summaries", max_entries=SUMMARY_CACHE_MAX_ENTRIES, max_bytes=SUMMARY_CACHE_MAX_BYTES, ttl=SUMMARY_CACHE_TTL)
+
+def summarize_descriptions(descriptions, user_description="", video_name="", duration=60, backend=None, use_cache=True):
     print("Summarizing descriptions...")
     concatenated_text = user_description + " " + " ".join(descriptions)
     max_summary_characters = 700 
@@ -101,41 +201,46 @@ def summarize_descriptions(descriptions, user_description="", video_name="", dur
         f"{concatenated_text}"
     )
 
-    print(f"Sending prompt to OpenAI:\n{prompt}")
+    messages = [
+        {"role": "system", "content": custom_system_message},
+        {"role": "user", "content": prompt}
+    ]
+    backend_name, chat = get_chat_backend(backend)
+
+    if use_cache:
+        cache = get_summary_cache()
+        key = hash_key(backend_name, SUMMARY_MODEL, custom_system_message, prompt)
+        summary = cache.get(key)
+        if summary is not None:
+            print("Using cached summary for identical prompt")
+            return summary
 
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": custom_system_message},
-            {"role": "user", "content": prompt}
-        ],
-        model="gpt-4o"
-    )
-    summary = response.choices[0].message.content
+    print(f"Sending prompt to {backend_name}:\n{prompt}")
+    summary = chat(SUMMARY_MODEL, messages)
+
+    if use_cache:
+        cache.set(key, summary)
     return summary
 
-def generate_tts_for_summary(summary, tts_output_folder, instrumental_folder, duration):
+def generate_tts_for_summary(summary, tts_output_folder, instrumental_folder, duration, mix=True):
+    # Returns the picked beat (or False if there is none). With mix=False the
+    # narration and beat are left for render_final_clip to mix in ffmpeg.
     os.makedirs(tts_output_folder, exist_ok=True)
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     tts_output_path = os.path.join(tts_output_folder, "summary_tts.mp3")
-    response = client.audio.speech.create(
-        model="tts-1",
-        voice="onyx",
-        input=summary
-    )
-    response.stream_to_file(Path(tts_output_path))
+    synthesize_speech(summary, tts_output_path, model="tts-1", voice="onyx")
     print(f"Generated TTS audio and saved to {tts_output_path}")
 
-    beat_files = [file for file in os.listdir(instrumental_folder) if file.endswith('.wav')]
-    if not beat_files:
+    beat = pick_beat(instrumental_folder)
+    if not beat:
         print("No beat files found in the directory.")
         return False
-    
-    beat_path = os.path.join(instrumental_folder, random.choice(beat_files))
-    beat_audio = AudioSegment.from_wav(beat_path)
-    beat_wav_path = os.path.join(tts_output_folder, "selected_beat.wav")
-    beat_audio.export(beat_wav_path, format="wav")
 
+    if mix:
+        mix_summary_audio(tts_output_path, beat, tts_output_folder, duration)
+    return beat
+
+def mix_summary_audio(tts_output_path, beat, tts_output_folder, duration):
     tts_audio = AudioSegment.from_file(tts_output_path)
     tts_duration_ms = tts_audio.duration_seconds * 1000
 
@@ -149,32 +254,34 @@ def generate_tts_for_summary(summary, tts_output_folder, instrumental_folder, du
         tts_audio = tts_audio[:duration * 1000]
         tts_duration_ms = duration * 1000
 
-    beat_audio = beat_audio[:tts_duration_ms]
-
-    beat_audio = beat_audio - 10  
+    beat_audio = beat_segment(beat, 0, tts_duration_ms / 1000, target_loudness=BEAT_LOUDNESS, fallback_gain=-10)
     tts_audio = tts_audio + 1     
 
     combined = beat_audio.overlay(tts_audio)
     combined_output_path = os.path.join(tts_output_folder, "combined_summary.mp3")
     combined.export(combined_output_path, format="mp3")
-    
-    return True
+    return combined_output_path
 
-def create_final_clip(video_path, tts_output_folder, project_folder, duration):
-    print("Creating final clip...")
+def final_clip_path(video_path, project_folder, start_time=0):
+    # Windows of one source can finish within the same second (or render
+    # side by side), so the window start is part of the name
     if not os.path.exists(project_folder):
         os.makedirs(project_folder)
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(project_folder, f"{video_name}_{start_time}s_{timestamp}.mp4")
+
+def create_final_clip(video_path, tts_output_folder, project_folder, duration, start_time=0):
+    print("Creating final clip...")
+    start = time.perf_counter()
     
     tts_path = os.path.join(tts_output_folder, "combined_summary.mp3")
     if not os.path.exists(tts_path):
         print(f"TTS output file not found: {tts_path}")
         return
     
-    video_name = os.path.splitext(os.path.basename(video_path))[0]
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_video_name = f"{video_name}_{timestamp}.mp4"
-    final_output_path = os.path.join(project_folder, output_video_name)
-    final_output_temp_path = os.path.join(project_folder, "final_temp_clip.mp4")
+    final_output_path = final_clip_path(video_path, project_folder, start_time)
+    final_output_temp_path = os.path.join(tts_output_folder, "final_temp_clip.mp4")
 
     if os.path.exists(final_output_temp_path):
         os.remove(final_output_temp_path)
@@ -185,7 +292,7 @@ def create_final_clip(video_path, tts_output_folder, project_folder, duration):
         .filter('crop', 'in_h*9/16', 'in_h')
         .filter('scale', 1080, 1920)  
         .output(final_output_temp_path, vcodec='libx264', pix_fmt='yuv420p')
-        .run()
+        .run(overwrite_output=True)
     )
     
     video = ffmpeg.input(final_output_temp_path)
@@ -194,12 +301,192 @@ def create_final_clip(video_path, tts_output_folder, project_folder, duration):
     (
         ffmpeg
         .output(video, audio, final_output_path, vcodec='libx264', acodec='aac', pix_fmt='yuv420p')
-        .run()
+        .run(overwrite_output=True)
     )
 
-    print(f'Final clip saved to "{final_output_path}"')
+    print(f'Final clip saved to "{final_output_path}" in {time.perf_counter() - start:.1f}s')
+    return final_output_path
+
+def render_final_clip(video_path, tts_path, beat, project_folder, duration, start_time=0):
+    # One ffmpeg graph instead of pydub mix -> MP3 -> encode -> re-encode:
+    # crop/scale the video, level and pad the narration, level and trim the
+    # beat, mix them and encode the final MP4 once.
+    print("Rendering final clip...")
+    start = time.perf_counter()
+    final_output_path = final_clip_path(video_path, project_folder, start_time)
 
-def process_videos(source_folder, old_source_folder, project_folder, user_description):
+    video = (
+        ffmpeg
+        .input(video_path, ss=0, t=duration)
+        .video
+        .filter('crop', 'in_h*9/16', 'in_h')
+        .filter('scale', 1080, 1920)
+    )
+    narration = (
+        ffmpeg
+        .input(tts_path)
+        .audio
+        .filter('aformat', sample_rates=44100, channel_layouts='stereo')
+        .filter('volume', '1dB')
+        .filter('atrim', end=duration)
+        .filter('apad', whole_dur=duration)
+    )
+    beat_audio = (
+        ffmpeg
+        .input(beat["pcm_path"], format='s16le', ar=beat["sample_rate"], ac=beat["channels"], t=duration)
+        .audio
+        .filter('volume', f"{beat_gain(beat, BEAT_LOUDNESS, -10)}dB")
+    )
+    audio = ffmpeg.filter([narration, beat_audio], 'amix', inputs=2, duration='first', normalize=0)
+
+    (
+        ffmpeg
+        .output(video, audio, final_output_path, vcodec='libx264', acodec='aac', pix_fmt='yuv420p', t=duration)
+        .run(overwrite_output=True)
+    )
+
+    print(f'Final clip saved to "{final_output_path}" in {time.perf_counter() - start:.1f}s')
+    return final_output_path
+
+def benchmark_render(video_path, tts_path, instrumental_folder, duration=60):
+    # Times the old mix + two-encode path against the single-graph render
+    beat = pick_beat(instrumental_folder)
+    benchmark_folder = os.path.join(TEMP_DIR, 'render_benchmark')
+    cleanup_folder(benchmark_folder)
+    shutil.copyfile(tts_path, os.path.join(benchmark_folder, "summary_tts.mp3"))
+
+    start = time.perf_counter()
+    mix_summary_audio(os.path.join(benchmark_folder, "summary_tts.mp3"), beat, benchmark_folder, duration)
+    create_final_clip(video_path, benchmark_folder, benchmark_folder, duration)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_final_clip(video_path, tts_path, beat, benchmark_folder, duration)
+    graph_seconds = time.perf_counter() - start
+
+    print(f"Legacy render: {legacy_seconds:.1f}s, single-graph render: {graph_seconds:.1f}s")
+
+def iter_window_jobs(video_files, source_folder, old_source_folder, project_folder, user_description, instrumental_folder,
+                     single_pass=True, sampling=FRAME_SAMPLING, temp_dir=TEMP_DIR, videos=None):
+    for video_file in video_files:
+        video_path = os.path.join(source_folder, video_file)
+        video_name = os.path.splitext(video_file)[0]
+        print(f"Processing video: {video_path}")
+
+        # Shared by every window of this file, so the last one to finish can
+        # move the source to old_source_material
+        video = {"path": video_path, "file": video_file, "old_source_folder": old_source_folder,
+                 "pending": 0, "extracted": False, "windows": 0, "rendered": 0}
+        if videos is not None:
+            videos.append(video)
+
+        for start_time, frames in iter_windows(video_path, window_duration=60, interval=1, single_pass=single_pass, sampling=sampling):
+            with VIDEO_LOCK:
+                video["pending"] += 1
+                video["windows"] += 1
+            yield {
+                "video": video,
+                "video_name": video_name,
+                "start_time": start_time,
+                "frames": frames,
+                "user_description": user_description,
+                "instrumental_folder": instrumental_folder,
+                "project_folder": project_folder,
+                "tts_output_folder": os.path.join(temp_dir, 'tts_outputs', f"{video_name}_{start_time}"),
+            }
+
+        with VIDEO_LOCK:
+            video["extracted"] = True
+            done = video["pending"] == 0
+        if done:
+            move_finished_video(video)
+
+def move_finished_video(video):
+    # Worker processes leave the move to the parent, see process_videos. A
+    # source with no rendered windows stays put so the next run retries it.
+    if not video["rendered"]:
+        print(f"No windows rendered for {video['path']}, keeping it in {os.path.dirname(video['path'])}")
+        return
+    if video["old_source_folder"]:
+        shutil.move(video["path"], os.path.join(video["old_source_folder"], video["file"]))
+
+def describe_window(job):
+    job["descriptions"] = generate_descriptions(job["frames"], job["user_description"], job["video_name"])
+    job["frames"] = None
+    return job
+
+def narrate_window(job):
+    tts_output_folder = job["tts_output_folder"]
+    cleanup_folder(tts_output_folder)
+
+    summary = summarize_descriptions(job["descriptions"], job["user_description"], job["video_name"], duration=60)
+    summary_path = os.path.join(tts_output_folder, "summary.txt")
+    with open(summary_path, 'w') as f:
+        f.write(summary)
+
+    job["beat"] = generate_tts_for_summary(summary, tts_output_folder, job["instrumental_folder"], duration=60,
+                                           mix=RENDER_MODE == "legacy")
+    job["tts_success"] = bool(job["beat"])
+    return job
+
+def render_window(job):
+    video = job["video"]
+    if job["tts_success"] and RENDER_MODE == "legacy":
+        create_final_clip(video["path"], job["tts_output_folder"], job["project_folder"], duration=60, start_time=job["start_time"])
+    elif job["tts_success"]:
+        tts_path = os.path.join(job["tts_output_folder"], "summary_tts.mp3")
+        render_final_clip(video["path"], tts_path, job["beat"], job["project_folder"], duration=60, start_time=job["start_time"])
+    else:
+        print(f"Skipping video due to TTS error: {video['path']}")
+    shutil.rmtree(job["tts_output_folder"], ignore_errors=True)
+
+    with VIDEO_LOCK:
+        video["pending"] -= 1
+        if job["tts_success"]:
+            video["rendered"] += 1
+        done = video["extracted"] and video["pending"] == 0
+    if done:
+        move_finished_video(video)
+    return job
+
+def run_window_jobs(jobs, pipelined=PIPELINED):
+    if not pipelined:
+        for job in jobs:
+            render_window(narrate_window(describe_window(job)))
+        return
+
+    # Caption window N+1 while window N waits on the LLM/TTS and N-1 encodes
+    run_stages(jobs, [
+        ("describe", describe_window, CAPTION_WORKERS),
+        ("narrate", narrate_window, NARRATE_WORKERS),
+        ("render", render_window, RENDER_WORKERS),
+    ], queue_size=PIPELINE_QUEUE_SIZE)
+
+def window_summary(video):
+    return f"{video['rendered']}/{video['windows']} windows rendered"
+
+def process_video_file(video_file, source_folder, project_folder, user_description, instrumental_folder,
+                       single_pass, sampling, pipelined, torch_threads):
+    # Runs in a worker process: its own lazily loaded BLIP, its own temp
+    # folder, and no move (the parent moves the source once we return).
+    if torch_threads:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+    temp_dir = os.path.join(TEMP_DIR, f"worker_{os.getpid()}")
+    videos = []
+    try:
+        jobs = iter_window_jobs([video_file], source_folder, None, project_folder, user_description, instrumental_folder,
+                                single_pass=single_pass, sampling=sampling, temp_dir=temp_dir, videos=videos)
+        run_window_jobs(jobs, pipelined=pipelined)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    if not videos[0]["rendered"]:
+        raise RuntimeError(window_summary(videos[0]))
+    return window_summary(videos[0])
+
+def process_videos(source_folder, old_source_folder, project_folder, user_description, single_pass=True,
+                   sampling=FRAME_SAMPLING, pipelined=PIPELINED, workers=1):
     instrumental_folders = {
         "1": "music/90s_boom-bap",
         "2": "music/dark_instrumental",
@@ -237,42 +524,48 @@ def process_videos(source_folder, old_source_folder, project_folder, user_descri
     
     if not os.path.exists(old_source_folder):
         os.makedirs(old_source_folder)
-        
-    for video_file in os.listdir(source_folder):
-        video_path = os.path.join(source_folder, video_file)
-        video_name = os.path.splitext(video_file)[0]
-        print(f"Processing video: {video_path}")
-        
-        frames_folder = os.path.join(TEMP_DIR, 'frames')
-        tts_output_folder = os.path.join(TEMP_DIR, 'tts_outputs')
-        
-        video_duration = int(ffmpeg.probe(video_path)['format']['duration'].split('.')[0])
-        start_times = [i for i in range(0, video_duration, 60)]
-
-        for start_time in start_times:
-            cleanup_folder(frames_folder)
-            cleanup_folder(tts_output_folder)
-
-            extract_frames(video_path, frames_folder, duration=60, interval=1, start_time=start_time)
-            descriptions = generate_descriptions(frames_folder, user_description, video_name)
-            summary = summarize_descriptions(descriptions, user_description, video_name, duration=60)
-            
-            summary_path = os.path.join(tts_output_folder, "summary.txt")
-            with open(summary_path, 'w') as f:
-                f.write(summary)
-            
-            tts_success = generate_tts_for_summary(summary, tts_output_folder, instrumental_folder, duration=60)
-            if not tts_success:
-                print(f"Skipping video due to TTS error: {video_path}")
-                continue
-            
-            create_final_clip(video_path, tts_output_folder, project_folder, duration=60)
-        
-        shutil.move(video_path, os.path.join(old_source_folder, video_file))
+
+    video_files = os.listdir(source_folder)
+    results = []
+
+    if workers > 1:
+        # Split the cores between workers unless TORCH_THREADS pins them
+        torch_threads = TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+        args = (source_folder, project_folder, user_description, instrumental_folder,
+                single_pass, sampling, pipelined, torch_threads)
+        for video_file, result in run_in_processes(process_video_file, video_files, workers, *args):
+            if result["status"] == "ok":
+                shutil.move(os.path.join(source_folder, video_file), os.path.join(old_source_folder, video_file))
+            results.append(result)
+        print_file_summary(results)
+        return
+
+    videos = []
+    jobs = iter_window_jobs(video_files, source_folder, old_source_folder, project_folder, user_description,
+                            instrumental_folder, single_pass=single_pass, sampling=sampling, videos=videos)
+    run_window_jobs(jobs, pipelined=pipelined)
+    for video in videos:
+        results.append({"file": video["file"], "status": "ok" if video["rendered"] else "failed", "detail": window_summary(video)})
+    print_file_summary(results)
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Narrate and render short clips from the source videos.")
+    parser.add_argument('--workers', type=int, default=1, help='Number of source videos to process in parallel')
+    parser.add_argument('--benchmark-captions', type=str, metavar='VIDEO', help='Time captioning of one window at several batch sizes')
+    parser.add_argument('--benchmark-render', nargs=3, metavar=('VIDEO', 'TTS', 'BEAT_FOLDER'), help='Time the legacy and single-graph renders')
+    args, _ = parser.parse_known_args()
+
+    if args.benchmark_captions:
+        benchmark_captioning(args.benchmark_captions)
+        sys.exit(0)
+    if args.benchmark_render:
+        benchmark_render(*args.benchmark_render)
+        sys.exit(0)
+
     source_folder = input("Enter the path to the source material folder: ")
     old_source_folder = "finished_material/old_source_material"
     project_folder = "finished_material/project_final_clips"
     user_description = input("Enter a brief description of the video content (optional): ")
-    process_videos(source_folder, old_source_folder, project_folder, user_description)
+    process_videos(source_folder, old_source_folder, project_folder, user_description, workers=args.workers)
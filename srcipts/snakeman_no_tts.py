@@ -4,11 +4,18 @@ import shutil
 from datetime import datetime
 from pathlib import Path
 import ffmpeg
-from pydub import AudioSegment
+from beats import beat_gain, index_beat_folder, pick_beat
+from pipeline import print_file_summary, run_in_processes, timed_call
+from probe import media_duration
 
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+# Integrated loudness (LUFS) every beat is brought to
+BEAT_LOUDNESS = float(os.getenv("BEAT_LOUDNESS", "-13"))
+# "encode" cuts exactly and encodes once, "copy" snaps cuts to keyframes and copies the video
+ASSEMBLY_MODE = os.getenv("ASSEMBLY_MODE", "encode")
+
 
 
 def cleanup_folder(folder):
@@ -17,93 +24,129 @@ def cleanup_folder(folder):
 
 
 
-def extract_clip(video_path, output_path, start_time, clip_duration):
-    if os.path.exists(output_path):
-        os.remove(output_path)  
+def get_video_duration(video_path):
+    return media_duration(video_path)
+
+def keyframe_times(video_path):
+    # Only keyframes are decoded (-skip_frame nokey), so this is cheap
+    probe = ffmpeg.probe(video_path, select_streams='v:0', skip_frame='nokey', show_entries='frame=pts_time')
+    return sorted(float(frame['pts_time']) for frame in probe.get('frames', []) if 'pts_time' in frame)
+
+def snap_to_keyframes(start_times, keyframes):
+    # Stream copy can only start a cut on a keyframe, so move each start back
+    # to the keyframe at or before it
+    return [max([k for k in keyframes if k <= start_time], default=0) for start_time in start_times]
+
+def pick_clips(video_duration, clip_count=3):
+    clip_durations = [random.randint(8, 14) for _ in range(clip_count)]
+    latest_start = int(video_duration - max(clip_durations))
+    start_times = sorted(random.sample(range(0, max(latest_start, clip_count)), clip_count))
+    clip_durations = [max(0, min(clip_duration, video_duration - start_time))
+                      for start_time, clip_duration in zip(start_times, clip_durations)]
+    return start_times, clip_durations
+
+def assemble_clip(video_path, start_times, clip_durations, beat, final_output_path):
+    # Trim, concat and beat overlay in one ffmpeg run with a single encode.
+    # Input-level ss/t already start each clip at zero; a setpts here would
+    # drop the frame rate from the graph and the output would fall back to 25 fps.
+    segments = [
+        ffmpeg.input(video_path, ss=start_time, t=clip_duration).video
+        for start_time, clip_duration in zip(start_times, clip_durations)
+    ]
+    video = ffmpeg.concat(*segments, v=1, a=0)
+    total_duration = sum(clip_durations)
+    audio = beat_input(beat, total_duration)
     (
         ffmpeg
-        .input(video_path, ss=start_time, t=clip_duration)
-        .output(output_path, vcodec='libx264', pix_fmt='yuv420p', an=None)  
-        .run()
+        .output(video, audio, final_output_path, vcodec='libx264', acodec='aac', pix_fmt='yuv420p', t=total_duration)
+        .run(overwrite_output=True)
     )
 
+def assemble_clip_copy(video_path, start_times, clip_durations, beat, final_output_path, temp_project_folder):
+    # Keyframe-snapped cuts joined by the concat demuxer and copied as-is;
+    # only the beat is encoded
+    keyframes = keyframe_times(video_path)
+    start_times = snap_to_keyframes(start_times, keyframes)
+
+    filelist_path = os.path.join(temp_project_folder, 'filelist.txt')
+    abs_video_path = os.path.abspath(video_path)
+    with open(filelist_path, 'w') as f:
+        for start_time, clip_duration in zip(start_times, clip_durations):
+            f.write(f"file '{abs_video_path}'\n")
+            f.write(f"inpoint {start_time:.3f}\n")
+            f.write(f"outpoint {start_time + clip_duration:.3f}\n")
+
+    with open(filelist_path, 'r') as f:
+        print(f"filelist.txt content:\n{f.read()}")
+
+    total_duration = sum(clip_durations)
+    video = ffmpeg.input(filelist_path, format='concat', safe=0).video
+    audio = beat_input(beat, total_duration)
+    (
+        ffmpeg
+        .output(video, audio, final_output_path, vcodec='copy', acodec='aac', t=total_duration)
+        .run(overwrite_output=True)
+    )
 
+def beat_input(beat, duration):
+    return (
+        ffmpeg
+        .input(beat["pcm_path"], format='s16le', ar=beat["sample_rate"], ac=beat["channels"], t=duration)
+        .audio
+        .filter('volume', f"{beat_gain(beat, BEAT_LOUDNESS, -3)}dB")
+    )
 
-def create_final_clip(video_path, instrumental_folder, temp_project_folder):
+def create_final_clip(video_path, instrumental_folder, temp_project_folder, mode=None):
     print("Creating final clip...")
+    mode = mode or ASSEMBLY_MODE
     if not os.path.exists(temp_project_folder):
         os.makedirs(temp_project_folder)
 
+    beat = pick_beat(instrumental_folder)
+    if not beat:
+        print("No beat files found in the directory.")
+        return False
+
     video_name = os.path.splitext(os.path.basename(video_path))[0]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_video_name = f"{video_name}_{timestamp}.mp4"
     final_output_path = os.path.join("finished_material/project_final_clips", output_video_name)
 
-    clip_durations = [random.randint(8, 14) for _ in range(3)]
-    start_times = sorted(random.sample(range(0, 60 - max(clip_durations)), 3))
-    clip_paths = []
+    start_times, clip_durations = pick_clips(get_video_duration(video_path))
 
-    for i, start_time in enumerate(start_times):
-        clip_duration = clip_durations[i]
-        clip_output_path = os.path.join(temp_project_folder, f"clip_{i}.mp4")
-        extract_clip(video_path, clip_output_path, start_time, clip_duration)
-        clip_paths.append(clip_output_path)
-
-    for clip_path in clip_paths:
-        if not os.path.exists(clip_path):
-            print(f"Error: Clip not found at {clip_path}")
-            return
-
-    filelist_path = os.path.join(temp_project_folder, 'filelist.txt')
-    with open(filelist_path, 'w') as f:
-        for clip_path in clip_paths:
-            abs_clip_path = os.path.abspath(clip_path)
-            f.write(f"file '{abs_clip_path}'\n")
-
-    with open(filelist_path, 'r') as f:
-        print(f"filelist.txt content:\n{f.read()}")
-
-    concatenated_clip_path = os.path.join(temp_project_folder, "concatenated_clip.mp4")
     try:
-        ffmpeg.input(filelist_path, format='concat', safe=0).output(concatenated_clip_path, c='copy').run()  
+        if mode == "copy":
+            assemble_clip_copy(video_path, start_times, clip_durations, beat, final_output_path, temp_project_folder)
+        else:
+            assemble_clip(video_path, start_times, clip_durations, beat, final_output_path)
     except ffmpeg.Error as e:
         error_message = e.stderr.decode() if e.stderr else "Unknown ffmpeg error"
         print(f"ffmpeg error: {error_message}")
-        return
-
-    video = ffmpeg.input(concatenated_clip_path)
-
-    beat_files = [file for file in os.listdir(instrumental_folder) if file.endswith('.wav')]
-    if not beat_files:
-        print("No beat files found in the directory.")
         return False
 
-    beat_path = os.path.join(instrumental_folder, random.choice(beat_files))
-    beat_audio = AudioSegment.from_wav(beat_path)
-    beat_audio = beat_audio - 3  
-
-    total_duration = sum(clip_durations)
-    beat_audio = beat_audio[:total_duration * 1000]  
-
-    audio_output_path = os.path.join(temp_project_folder, "beat_audio.mp3")
-    beat_audio.export(audio_output_path, format="mp3")
-
-    audio = ffmpeg.input(audio_output_path)
-
-    (
-        ffmpeg
-        .output(video, audio, final_output_path, vcodec='libx264', acodec='aac', pix_fmt='yuv420p', y=None)
-        .run()
-    )
-
     print(f'Final clip saved to "{final_output_path}"')
 
     
     cleanup_folder(temp_project_folder)
+    return True
+
 
 
+def process_video_file(video_file, source_folder, instrumental_folder):
+    # Each file gets its own temp/temp_<name> folder, so this is safe to run
+    # in several worker processes at once
+    video_path = os.path.join(source_folder, video_file)
+    temp_project_folder = os.path.join("temp", f"temp_{os.path.splitext(video_file)[0]}")
+    print(f"Processing video: {video_path}")
 
-def process_videos(source_folder, old_source_folder, project_folder):
+    # Raising marks the file as failed, so it stays in the source folder
+    if not index_beat_folder(instrumental_folder):
+        raise RuntimeError(f"no beat files found in {instrumental_folder}")
+    if not create_final_clip(video_path, instrumental_folder, temp_project_folder):
+        raise RuntimeError("final clip could not be created")
+    return "final clip created"
+
+def process_videos(source_folder, old_source_folder, project_folder, workers=1):
     instrumental_folders = {
         "1": "music/90s_boom-bap",
         "2": "music/dark_instrumental",
@@ -142,21 +185,37 @@ def process_videos(source_folder, old_source_folder, project_folder):
     if not os.path.exists(old_source_folder):
         os.makedirs(old_source_folder)
 
+    if workers > 1:
+        results = []
+        for video_file, result in run_in_processes(process_video_file, os.listdir(source_folder), workers, source_folder, instrumental_folder):
+            if result["status"] == "ok":
+                shutil.move(os.path.join(source_folder, video_file), os.path.join(old_source_folder, video_file))
+            results.append(result)
+        print_file_summary(results)
+        return
+
+    results = []
     for video_file in os.listdir(source_folder):
         video_path = os.path.join(source_folder, video_file)
-        temp_project_folder = os.path.join("temp", f"temp_{os.path.splitext(video_file)[0]}")
-        print(f"Processing video: {video_path}")
-
         try:
-            create_final_clip(video_path, instrumental_folder, temp_project_folder)
+            detail, seconds = timed_call(process_video_file, video_file, source_folder, instrumental_folder)
         except Exception as e:
             print(f"Skipping video {video_file} due to error: {e}")
+            results.append({"file": video_file, "status": "failed", "detail": str(e)})
             continue
 
         shutil.move(video_path, os.path.join(old_source_folder, video_file))
+        results.append({"file": video_file, "status": "ok", "detail": detail, "seconds": seconds})
+    print_file_summary(results)
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cut short clips with a beat from the source videos.")
+    parser.add_argument('--workers', type=int, default=1, help='Number of source videos to process in parallel')
+    args, _ = parser.parse_known_args()
+
     source_folder = input("Enter the path to the source material folder: ")
     old_source_folder = "finished_material/old_source_material"
     project_folder = "finished_material/project_final_clips"
-    process_videos(source_folder, old_source_folder, project_folder)
+    process_videos(source_folder, old_source_folder, project_folder, workers=args.workers)
@@ -0,0 +1,74 @@
+import unittest
+import os
+import cache
+from cache_fixture import TempCacheTestCase
+
+class TestSqliteCache(TempCacheTestCase):
+
+    def test_hits_and_misses(self):
+        captions = cache.SqliteCache("captions")
+        key = cache.hash_key("model", "settings", b"pixels")
+        self.assertIsNone(captions.get(key))
+        captions.set(key, "a boxer throws a punch")
+        self.assertEqual(captions.get(key), "a boxer throws a punch")
+        self.assertEqual(captions.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_persists_between_instances(self):
+        cache.SqliteCache("captions").set("key", "caption")
+        self.assertEqual(cache.SqliteCache("captions").get("key"), "caption")
+
+    def test_evicts_least_recently_used(self):
+        captions = cache.SqliteCache("captions", max_entries=2)
+        captions.set("first", "one")
+        captions.set("second", "two")
+        captions.get("first")
+        captions.set("third", "three")
+        self.assertEqual(captions.get("first"), "one")
+        self.assertIsNone(captions.get("second"))
+        self.assertEqual(captions.get("third"), "three")
+
+    def test_expires_after_ttl(self):
+        summaries = cache.SqliteCache("summaries", ttl=60)
+        summaries.set("key", "summary")
+        summaries.db.execute("UPDATE entries SET created = created - 120")
+        self.assertIsNone(summaries.get("key"))
+        self.assertEqual(summaries.stats()["entries"], 0)
+
+    def test_evicts_to_size_cap(self):
+        summaries = cache.SqliteCache("summaries", max_bytes=50)
+        summaries.set("old", "x" * 30)
+        summaries.set("new", "y" * 30)
+        self.assertIsNone(summaries.get("old"))
+        self.assertEqual(summaries.get("new"), "y" * 30)
+
+    def test_hash_key_separates_parts(self):
+        self.assertNotEqual(cache.hash_key("ab", "c"), cache.hash_key("a", "bc"))
+
+class TestFileCache(TempCacheTestCase):
+
+    def write_file(self, name, size):
+        path = os.path.join(self.cache_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_put_and_get(self):
+        tts = cache.FileCache("tts")
+        self.assertIsNone(tts.get("key"))
+        cached_path = tts.put("key", self.write_file("summary_tts.mp3", 10))
+        self.assertEqual(tts.get("key"), cached_path)
+        self.assertTrue(cached_path.endswith("key.mp3"))
+        self.assertEqual(tts.stats(), {"hits": 1, "misses": 1, "entries": 1, "bytes": 10})
+
+    def test_evicts_oldest_files_over_size_cap(self):
+        tts = cache.FileCache("tts", max_bytes=25)
+        first = tts.put("first", self.write_file("a.mp3", 10))
+        tts.put("second", self.write_file("b.mp3", 10))
+        tts.get("first")
+        tts.put("third", self.write_file("c.mp3", 10))
+        self.assertIsNone(tts.get("second"))
+        self.assertEqual(tts.get("first"), first)
+        self.assertEqual(tts.stats()["bytes"], 20)
+
+if __name__ == '__main__':
+    unittest.main()
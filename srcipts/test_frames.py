@@ -0,0 +1,88 @@
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import mock
+import numpy as np
+import frames
+import snakeman
+from frames import dedupe_frames, fingerprint_similarity, frame_hash, hash_distance, pick_scene_frames
+
+class TestFrameDedupe(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.scene_a = rng.integers(0, 255, (72, 128, 3), dtype=np.uint8)
+        self.scene_b = rng.integers(0, 255, (72, 128, 3), dtype=np.uint8)
+
+    def test_hash_ignores_small_changes(self):
+        brighter = np.clip(self.scene_a.astype(int) + 2, 0, 255).astype(np.uint8)
+        self.assertLessEqual(hash_distance(frame_hash(self.scene_a), frame_hash(brighter)), 4)
+        self.assertGreater(hash_distance(frame_hash(self.scene_a), frame_hash(self.scene_b)), 4)
+
+    def test_duplicates_point_at_last_kept_frame(self):
+        frames = [self.scene_a, self.scene_a, self.scene_b, self.scene_b, self.scene_a]
+        self.assertEqual(dedupe_frames(frames, max_distance=4), [0, 0, 2, 2, 4])
+
+    def test_zero_distance_keeps_changed_frames(self):
+        frames = [self.scene_a, self.scene_b]
+        self.assertEqual(dedupe_frames(frames, max_distance=0), [0, 1])
+
+class TestSceneSampling(unittest.TestCase):
+
+    def test_picks_highest_scores_per_window(self):
+        scores = [0, 0, 50, 0, 0, 0, 0, 30, 0, 40]
+        self.assertEqual(pick_scene_frames(scores, 5, min_frames=1, max_frames=2), [[2], [7, 9]])
+
+    def test_respects_max_frames_and_gap(self):
+        scores = [0, 20, 21, 22, 23, 24]
+        self.assertEqual(pick_scene_frames(scores, 6, min_frames=1, max_frames=2, min_gap=2), [[3, 5]])
+
+    def test_static_window_is_topped_up_to_min_frames(self):
+        self.assertEqual(pick_scene_frames([0] * 8, 8, min_frames=4, max_frames=6), [[0, 2, 4, 6]])
+
+class TestFingerprintSimilarity(unittest.TestCase):
+
+    def test_trimmed_copy_matches(self):
+        original = [0x0F0F, 0xF0F0, 0xFF00, 0x00FF, 0xAAAA]
+        trimmed = [0xF0F1, 0xFF00, 0x00FF, 0xAAAB]
+        self.assertEqual(fingerprint_similarity(original, trimmed, max_distance=2), 0.8)
+
+    def test_takes_the_lower_direction(self):
+        original = [0x0F0F, 0xF0F0]
+        longer = [0x0F0F, 0xF0F0, 0xFFFF0000, 0x0000FFFF]
+        self.assertEqual(fingerprint_similarity(original, longer, max_distance=0), 0.5)
+
+    def test_empty_fingerprint_matches_nothing(self):
+        self.assertEqual(fingerprint_similarity([], [0x0F0F]), 0.0)
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "needs ffmpeg")
+class TestWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def windows(self, duration, **options):
+        path = os.path.join(self.work_dir, f"source_{duration}.mp4")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=size=160x120:rate=5",
+                        "-t", str(duration), path], check=True)
+        # The durations are known, so no ffprobe is needed
+        info = {"duration": duration, "width": 160, "height": 120}
+        with mock.patch.object(frames, "media_info", lambda path: info), \
+                mock.patch.object(snakeman, "media_duration", lambda path: duration):
+            return [start for start, _ in snakeman.iter_windows(path, window_duration=10, **options)]
+
+    def test_single_pass_matches_per_window(self):
+        for duration in (10.6, 15.5, 20):
+            with self.subTest(duration=duration):
+                per_window = self.windows(duration, single_pass=False, sampling="interval")
+                self.assertEqual(per_window, list(range(0, int(duration), 10)))
+                self.assertEqual(self.windows(duration, single_pass=True, sampling="interval"), per_window)
+                self.assertEqual(self.windows(duration, sampling="scene"), per_window)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "3.0"))
+
+# Modules that must only be loaded on first use, never at import time
+HEAVY_MODULES = ["torch", "transformers"]
+
+SCRIPTS = [
+    "snakeman",
+    "snakeman_no_tts",
+    "warhammer",
+    "stand",
+    "video_downloader",
+    "image_downloader",
+    "image_captioner",
+    "thumbnail_maker",
+    "convert",
+]
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+try:
+    import {module}
+except ImportError as e:
+    print("missing", e.name)
+    sys.exit(0)
+elapsed = time.perf_counter() - start
+print("ok", elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+class TestImportTime(unittest.TestCase):
+
+    def import_script(self, module):
+        env = dict(os.environ, PYTHONPATH=SCRIPTS_DIR, YOUTUBE_API_KEY=os.getenv("YOUTUBE_API_KEY", "test"))
+        # Some scripts create or wipe folders relative to the cwd on import
+        with tempfile.TemporaryDirectory() as cwd:
+            os.makedirs(os.path.join(cwd, "finished_material"))
+            result = subprocess.run(
+                [sys.executable, "-c", IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES)],
+                cwd=cwd, env=env, capture_output=True, text=True
+            )
+        self.assertEqual(result.returncode, 0, f"Importing {module} failed:\n{result.stderr}")
+        return result.stdout.strip().splitlines()[-1].split(" ")
+
+    def test_scripts_import_under_budget(self):
+        for module in SCRIPTS:
+            with self.subTest(module=module):
+                status, *details = self.import_script(module)
+                if status == "missing":
+                    self.skipTest(f"{module} needs {details[0]}, which is not installed")
+                elapsed, loaded = float(details[0]), details[1] if len(details) > 1 else ""
+                print(f"{module}: {elapsed:.2f}s")
+                self.assertLess(elapsed, IMPORT_TIME_BUDGET, f"Importing {module} took {elapsed:.2f}s")
+                self.assertEqual(loaded, "", f"Importing {module} loaded {loaded}")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ import ffmpeg
 import random
 from pathlib import Path
 from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
+from probe import media_duration
 
 
 def download_videos(api_key, keyword, source_folder):
@@ -56,7 +57,7 @@ def download_videos(api_key, keyword, source_folder):
     def split_video_into_clips(input_path, output_folder, clip_duration=60):
         try:
             base_name = os.path.splitext(os.path.basename(input_path))[0]
-            video_duration = int(ffmpeg.probe(input_path)['format']['duration'].split('.')[0])
+            video_duration = int(media_duration(input_path))
             end_time = min(video_duration, 300)  
 
            
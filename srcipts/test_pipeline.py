@@ -0,0 +1,105 @@
+import unittest
+import os
+import threading
+import time
+from pipeline import ByteBudget, ClipCounter, run_in_processes, run_stages
+
+class TestRunStages(unittest.TestCase):
+
+    def test_matches_sequential_results(self):
+        results = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                results.append(item)
+            return item
+
+        stages = [
+            ("double", lambda x: x * 2, 2),
+            ("slow", lambda x: time.sleep(0.01) or x + 1, 3),
+            ("collect", collect, 1),
+        ]
+        run_stages(range(20), stages, queue_size=2)
+        self.assertEqual(sorted(results), [x * 2 + 1 for x in range(20)])
+
+    def test_source_is_throttled_by_queue_size(self):
+        produced = []
+        in_flight = []
+
+        def source():
+            for i in range(10):
+                produced.append(i)
+                in_flight.append(len(produced) - len(done))
+                yield i
+
+        done = []
+        stages = [("slow", lambda x: time.sleep(0.01) or done.append(x), 1)]
+        run_stages(source(), stages, queue_size=1)
+        self.assertEqual(len(done), 10)
+        # queued + being processed + the one being handed over
+        self.assertLessEqual(max(in_flight), 3)
+
+    def test_errors_are_raised_after_draining(self):
+        def fail_on_three(x):
+            if x == 3:
+                raise ValueError("bad window")
+            return x
+
+        with self.assertRaises(ValueError):
+            run_stages(range(10), [("check", fail_on_three, 2), ("noop", lambda x: x, 1)])
+
+class TestByteBudget(unittest.TestCase):
+
+    def reserve_in_thread(self, budget, size):
+        thread = threading.Thread(target=budget.reserve, args=(size,), daemon=True)
+        thread.start()
+        thread.join(0.1)
+        return thread
+
+    def test_reserving_waits_for_room(self):
+        budget = ByteBudget(100)
+        budget.reserve(60)
+        waiting = self.reserve_in_thread(budget, 60)
+        self.assertTrue(waiting.is_alive())
+        budget.release(60)
+        waiting.join(1)
+        self.assertFalse(waiting.is_alive())
+        self.assertEqual(budget.used, 60)
+
+    def test_adjust_swaps_estimate_for_real_size(self):
+        budget = ByteBudget(100)
+        budget.reserve(80)
+        waiting = self.reserve_in_thread(budget, 50)
+        self.assertTrue(waiting.is_alive())
+        budget.adjust(80, 30)
+        waiting.join(1)
+        self.assertFalse(waiting.is_alive())
+        self.assertEqual(budget.used, 80)
+
+    def test_oversized_item_goes_through_alone(self):
+        budget = ByteBudget(100)
+        budget.reserve(500)
+        self.assertTrue(self.reserve_in_thread(budget, 1).is_alive())
+        budget.release(500)
+
+class TestClipCounter(unittest.TestCase):
+
+    def test_counts_up_to_target(self):
+        clips = ClipCounter(3, 10)
+        self.assertFalse(clips.reached())
+        self.assertEqual(clips.add(5), 8)
+        self.assertFalse(clips.reached())
+        clips.add(2)
+        self.assertTrue(clips.reached())
+
+class TestRunInProcesses(unittest.TestCase):
+
+    def test_reports_each_file(self):
+        results = dict(run_in_processes(os.path.basename, ["a/one.mp4", "b/two.mp4", None], 2))
+        self.assertEqual(results["a/one.mp4"]["status"], "ok")
+        self.assertEqual(results["b/two.mp4"]["detail"], "two.mp4")
+        self.assertEqual(results[None]["status"], "failed")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import time
+import probe
+from cache_fixture import TempCacheTestCase
+
+FAKE_PROBE = {
+    "format": {"duration": "12.5"},
+    "streams": [
+        {"codec_type": "video", "width": 1920, "height": 1080, "avg_frame_rate": "30000/1001"},
+        {"codec_type": "audio", "sample_rate": "48000", "channels": 2},
+    ],
+}
+
+class TestProbeCache(TempCacheTestCase):
+    cached_getters = (probe.get_probe_cache,)
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        self.original_probe = probe.ffmpeg.probe
+        probe.ffmpeg.probe = lambda path: self.calls.append(path) or FAKE_PROBE
+        self.media_path = os.path.join(self.cache_dir, "clip.mp4")
+        with open(self.media_path, "wb") as f:
+            f.write(b"video")
+
+    def tearDown(self):
+        probe.ffmpeg.probe = self.original_probe
+
+    def test_media_info(self):
+        info = probe.media_info(self.media_path)
+        self.assertEqual(info["duration"], 12.5)
+        self.assertEqual((info["width"], info["height"]), (1920, 1080))
+        self.assertAlmostEqual(info["fps"], 29.97, places=2)
+        self.assertEqual(info["sample_rate"], 48000)
+
+    def test_probes_unchanged_file_once(self):
+        probe.media_duration(self.media_path)
+        probe.media_info(self.media_path)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_reprobes_modified_file(self):
+        probe.media_duration(self.media_path)
+        later = time.time() + 10
+        os.utime(self.media_path, (later, later))
+        probe.media_duration(self.media_path)
+        self.assertEqual(len(self.calls), 2)
+
+if __name__ == '__main__':
+    unittest.main()
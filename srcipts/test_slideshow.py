@@ -0,0 +1,56 @@
+import unittest
+import os
+import slideshow
+from cache_fixture import TempCacheTestCase
+
+class TestSegmentCache(TempCacheTestCase):
+    cached_getters = (slideshow.get_segment_cache, slideshow.get_working_image_cache)
+
+    def setUp(self):
+        super().setUp()
+        self.work_dir = os.path.join(self.cache_dir, "work")
+        os.makedirs(self.work_dir)
+        self.rendered = []
+        self.original_create = slideshow.create_video_segment
+        slideshow.create_video_segment = self.fake_create
+        self.images = []
+        for name, content in [("a.jpg", b"image a"), ("b.jpg", b"image b"), ("copy_of_a.jpg", b"image a")]:
+            path = os.path.join(self.work_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            self.images.append(path)
+
+    def tearDown(self):
+        slideshow.create_video_segment = self.original_create
+
+    def fake_create(self, image_path, output_path, duration=30):
+        self.rendered.append((image_path, duration))
+        with open(output_path, "wb") as f:
+            f.write(f"{image_path} {duration}".encode())
+
+    def jobs(self, images, duration=30):
+        return [(image, os.path.join(self.work_dir, f"segment_{i}.mp4"), duration) for i, image in enumerate(images)]
+
+    def test_renders_each_unique_segment_once(self):
+        a, b, copy_of_a = self.images
+        paths = slideshow.render_segments(self.jobs([a, b, a, copy_of_a, b]))
+        self.assertEqual(len(self.rendered), 2)
+        self.assertEqual(paths[0], paths[2])
+        self.assertEqual(paths[0], paths[3])
+        self.assertEqual(paths[1], paths[4])
+        self.assertNotEqual(paths[0], paths[1])
+
+    def test_reuses_segments_between_runs(self):
+        a, b, _ = self.images
+        slideshow.render_segments(self.jobs([a, b]))
+        slideshow.render_segments(self.jobs([b, a]))
+        self.assertEqual(len(self.rendered), 2)
+
+    def test_duration_is_part_of_the_key(self):
+        a = self.images[0]
+        slideshow.render_segments(self.jobs([a], duration=30))
+        slideshow.render_segments(self.jobs([a], duration=12.5))
+        self.assertEqual(self.rendered, [(a, 30), (a, 12.5)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+import clients
+import snakeman
+from cache_fixture import TempCacheTestCase
+
+class TestSummaryCache(TempCacheTestCase):
+    cached_getters = (snakeman.get_summary_cache,)
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        def counting_stub(model, messages):
+            self.calls.append(model)
+            return clients.stub_chat(model, messages)
+        patcher = mock.patch.dict(clients.CHAT_BACKENDS, {"stub": counting_stub, "other_stub": counting_stub})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def summarize(self, backend="stub"):
+        return snakeman.summarize_descriptions(["a boxer throws a jab"], video_name="fight.mp4", backend=backend)
+
+    def test_identical_prompt_is_a_cache_hit(self):
+        first = self.summarize()
+        self.assertEqual(self.summarize(), first)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(snakeman.get_summary_cache().stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_key_separates_backend_and_model(self):
+        self.summarize()
+        self.summarize(backend="other_stub")
+        with mock.patch.object(snakeman, "SUMMARY_MODEL", "gpt-4o-mini"):
+            self.summarize()
+        self.assertEqual(self.calls, [snakeman.SUMMARY_MODEL, snakeman.SUMMARY_MODEL, "gpt-4o-mini"])
+        self.assertEqual(snakeman.get_summary_cache().stats()["entries"], 3)
+
+    def test_summary_cache_has_a_size_cap(self):
+        self.assertEqual(snakeman.get_summary_cache().max_bytes, snakeman.SUMMARY_CACHE_MAX_BYTES)
+
+class TestMoveFinishedVideo(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.old_source_folder = os.path.join(self.work_dir, "old")
+        os.makedirs(self.old_source_folder)
+        self.path = os.path.join(self.work_dir, "fight.mp4")
+        with open(self.path, "wb") as f:
+            f.write(b"video")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def video(self, rendered):
+        return {"path": self.path, "file": "fight.mp4", "old_source_folder": self.old_source_folder,
+                "windows": 3, "rendered": rendered}
+
+    def test_source_with_no_rendered_windows_stays(self):
+        snakeman.move_finished_video(self.video(0))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_source_with_rendered_windows_is_moved(self):
+        snakeman.move_finished_video(self.video(1))
+        self.assertTrue(os.path.exists(os.path.join(self.old_source_folder, "fight.mp4")))
+        self.assertFalse(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import os
+import shutil
+import subprocess
+import tempfile
+import ffmpeg
+import snakeman_no_tts
+
+@unittest.skipUnless(shutil.which("ffmpeg") and shutil.which("ffprobe"), "needs ffmpeg and ffprobe")
+class TestAssembleClip(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.beat = {"pcm_path": os.path.join(self.work_dir, "beat.pcm"), "sample_rate": 44100, "channels": 2, "loudness": None}
+        with open(self.beat["pcm_path"], "wb") as f:
+            f.write(bytes(44100 * 2 * 2 * 10))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def make_source(self, fps):
+        path = os.path.join(self.work_dir, f"source_{fps}.mp4")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", f"testsrc=size=320x240:rate={fps}",
+                        "-t", "12", "-g", str(fps), path], check=True)
+        return path
+
+    def frame_rate(self, path):
+        stream = next(s for s in ffmpeg.probe(path)["streams"] if s["codec_type"] == "video")
+        return stream["avg_frame_rate"]
+
+    def test_keeps_source_frame_rate(self):
+        for fps in (30, 60):
+            with self.subTest(fps=fps):
+                source = self.make_source(fps)
+                output = os.path.join(self.work_dir, f"out_{fps}.mp4")
+                snakeman_no_tts.assemble_clip(source, [0, 4, 8], [2, 2, 2], self.beat, output)
+                self.assertEqual(self.frame_rate(output), self.frame_rate(source))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import video_index
+from cache_fixture import TempCacheTestCase
+
+class TestVideoIndex(TempCacheTestCase):
+    cache_dir_modules = (video_index,)
+
+    def setUp(self):
+        super().setUp()
+        self.index = video_index.VideoIndex()
+
+    def tearDown(self):
+        self.index.db.close()
+
+    def test_known_videos_are_not_added_again(self):
+        self.assertTrue(self.index.add("abc", "Big fight", "boxing"))
+        self.assertFalse(self.index.add("abc", "Big fight", "boxing"))
+        self.assertFalse(video_index.VideoIndex().add("abc", "Big fight", "boxing"))
+
+    def test_pending_videos_survive_between_runs(self):
+        self.index.add("abc", "Big fight", "boxing")
+        self.index.add("def", "Knockout", "boxing")
+        self.index.set_status("abc", "split", 5)
+        self.assertEqual(video_index.VideoIndex().pending("boxing"), [("def", "Knockout")])
+        self.assertEqual(self.index.stats()["videos"], {"queued": 1, "split": 1})
+
+    def test_search_position(self):
+        self.assertEqual(self.index.search_position("boxing"), (None, False))
+        self.index.save_search_position("boxing", "PAGE2")
+        self.assertEqual(video_index.VideoIndex().search_position("boxing"), ("PAGE2", False))
+        self.index.save_search_position("boxing", None)
+        self.assertEqual(self.index.search_position("boxing"), (None, True))
+        self.index.reset_search_position("boxing")
+        self.assertEqual(self.index.search_position("boxing"), (None, False))
+
+    def test_exhausted_search_is_refreshed(self):
+        self.index.save_search_position("boxing", None)
+        self.assertEqual(self.index.search_position("boxing", refresh_days=7), (None, True))
+        self.index.db.execute("UPDATE searches SET updated = updated - 8 * 86400")
+        self.assertEqual(self.index.search_position("boxing", refresh_days=7), (None, False))
+        self.index.save_search_position("boxing", "PAGE2")
+        self.index.db.execute("UPDATE searches SET updated = updated - 8 * 86400")
+        self.assertEqual(self.index.search_position("boxing", refresh_days=7), ("PAGE2", False))
+
+    def test_claim_fingerprint_flags_duplicates(self):
+        fight = [0x0F0F, 0xF0F0, 0xFF00, 0x00FF]
+        self.assertIsNone(self.index.claim_fingerprint("abc", fight))
+        self.assertEqual(video_index.VideoIndex().claim_fingerprint("def", [0x0F0E, 0xF0F0, 0xFF00, 0x00FF]), "abc")
+        self.assertIsNone(self.index.claim_fingerprint("ghi", [0xFFFFFFFF00000000, 0x00000000FFFFFFFF]))
+        self.assertIsNone(self.index.claim_fingerprint("abc", fight))
+
+    def test_failed_split_does_not_block_reuploads(self):
+        fight = [0x0F0F, 0xF0F0, 0xFF00, 0x00FF]
+        self.index.add("abc", "Big fight", "boxing")
+        self.assertIsNone(self.index.claim_fingerprint("abc", fight))
+        self.index.forget_fingerprint("abc")
+        self.index.set_status("abc", "split_failed")
+        self.assertIsNone(self.index.claim_fingerprint("def", fight))
+        self.assertEqual(self.index.claim_fingerprint("ghi", fight), "def")
+
+    def test_quota(self):
+        self.index.spend_quota(video_index.SEARCH_QUOTA_COST)
+        self.index.spend_quota(video_index.SEARCH_QUOTA_COST)
+        stats = self.index.stats()
+        self.assertEqual(stats["quota_today"], 200)
+        self.assertEqual(stats["quota_total"], 200)
+
+if __name__ == '__main__':
+    unittest.main()
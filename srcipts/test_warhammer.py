@@ -0,0 +1,26 @@
+import unittest
+import warhammer
+
+class TestSplitScript(unittest.TestCase):
+
+    def test_chunks_end_on_sentences(self):
+        text = "One two three. Four five six! Seven eight nine? Ten."
+        chunks = warhammer.split_script(text, max_chars=30)
+        self.assertEqual(chunks, ["One two three. Four five six!", "Seven eight nine? Ten."])
+
+    def test_chunks_stay_inside_paragraphs(self):
+        text = "First paragraph. Still first.\n\nSecond paragraph."
+        chunks = warhammer.split_script(text, max_chars=2000)
+        self.assertEqual(chunks, ["First paragraph. Still first.", "Second paragraph."])
+
+        edited = warhammer.split_script("First paragraph. Still first.\n\nSecond paragraph, edited.", max_chars=2000)
+        self.assertEqual(edited[0], chunks[0])
+
+    def test_long_sentence_is_split_on_spaces(self):
+        text = "word " * 30
+        chunks = warhammer.split_script(text, max_chars=24)
+        self.assertTrue(all(len(chunk) <= 24 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), text.split())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,13 @@
+import csv
 import os
 import sys
+import time
 from googleapiclient.discovery import build
 import yt_dlp as youtube_dl
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
 import ffmpeg
+from frames import video_fingerprint
+from pipeline import ByteBudget, ClipCounter, run_stages
+from video_index import SEARCH_QUOTA_COST, SEARCH_REFRESH_DAYS, VideoIndex
 
 # Get the API key from the environment variable
 API_KEY = os.getenv('YOUTUBE_API_KEY')
@@ -12,6 +16,31 @@ if not API_KEY:
     print("Error: API key not found. Please set the environment variable 'YOUTUBE_API_KEY'.")
     sys.exit(1)
 
+TARGET_CLIPS = int(os.getenv("TARGET_CLIPS", "200"))
+# Only the first MAX_SOURCE_SECONDS of each video are split into clips.
+# "copy" cuts on the first keyframe after each boundary without re-encoding,
+# "exact" re-encodes with keyframes forced onto the boundaries.
+MAX_SOURCE_SECONDS = 300
+MIN_CLIP_SECONDS = 1
+SPLIT_MODE = os.getenv("SPLIT_MODE", "copy")
+# Downloads run DOWNLOAD_WORKERS at a time and hand finished files to
+# SPLIT_WORKERS splitters. Each download reserves its expected size before
+# it starts and new downloads wait while the videos downloading or waiting
+# to be split would add up to more than MAX_INFLIGHT_BYTES; a video whose
+# size yt-dlp doesn't report reserves UNKNOWN_VIDEO_BYTES
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "3"))
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", "1"))
+DOWNLOAD_ATTEMPTS = int(os.getenv("DOWNLOAD_ATTEMPTS", "3"))
+DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", "5"))
+MAX_INFLIGHT_BYTES = int(os.getenv("MAX_INFLIGHT_BYTES", str(4 * 1024 ** 3)))
+UNKNOWN_VIDEO_BYTES = int(os.getenv("UNKNOWN_VIDEO_BYTES", str(500 * 1024 ** 2)))
+VIDEO_FORMAT = 'best[height<=1080]'
+# A download is dropped as a re-upload when at least DUPLICATE_SIMILARITY of
+# its fingerprint frames match an earlier video's within FINGERPRINT_DISTANCE bits
+FINGERPRINT_FRAMES = 16
+FINGERPRINT_DISTANCE = 10
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.8"))
+
 def create_source_material_folder(folder):
     if not os.path.exists(folder):
         os.makedirs(folder)
@@ -19,22 +48,24 @@ def create_source_material_folder(folder):
     else:
         print(f"Folder already exists: {folder}")
 
-def search_youtube_videos(api_key, keyword, max_results=50):
+def search_youtube_videos(api_key, keyword, max_results=50, page_token=None):
     youtube = build('youtube', 'v3', developerKey=api_key)
     request = youtube.search().list(
         part='snippet',
         q=keyword,
         maxResults=max_results,
         type='video',
-        videoLicense='creativeCommon'
+        videoLicense='creativeCommon',
+        pageToken=page_token
     )
     response = request.execute()
-    return [(item['id']['videoId'], item['snippet']['title']) for item in response['items']]
+    videos = [(item['id']['videoId'], item['snippet']['title']) for item in response['items']]
+    return videos, response.get('nextPageToken')
 
 def download_video(video_id, title, output_path):
     url = f"https://www.youtube.com/watch?v={video_id}"
     ydl_opts = {
-        'format': 'best[height<=1080]',
+        'format': VIDEO_FORMAT,
         'outtmpl': output_path,
         'retries': 3,
         'noprogress': True,
@@ -48,49 +79,179 @@ def download_video(video_id, title, output_path):
             print(f"Error downloading video {title}: {e}")
             return False
 
-def split_video_into_clips(input_path, output_folder, clip_duration=60):
+def estimate_download_size(video_id, title):
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    ydl_opts = {'format': VIDEO_FORMAT, 'quiet': True, 'noprogress': True}
+    try:
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        print(f"Could not look up the size of {title}: {e}")
+        return UNKNOWN_VIDEO_BYTES
+    return info.get('filesize') or info.get('filesize_approx') or UNKNOWN_VIDEO_BYTES
+
+def download_with_retry(video_id, title, output_path, attempts=DOWNLOAD_ATTEMPTS, backoff=DOWNLOAD_BACKOFF):
+    for attempt in range(1, attempts + 1):
+        if download_video(video_id, title, output_path):
+            return True
+        if attempt < attempts:
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"Retrying {title} in {delay:.0f}s (attempt {attempt + 1} of {attempts})")
+            time.sleep(delay)
+    return False
+
+def split_video_into_clips(input_path, output_folder, clip_duration=60, mode=None):
+    mode = mode or SPLIT_MODE
     try:
         base_name = os.path.splitext(os.path.basename(input_path))[0]
-        video_duration = int(ffmpeg.probe(input_path)['format']['duration'].split('.')[0])
-        end_time = min(video_duration, 300)
-         
-        trimmed_path = os.path.join(output_folder, f"{base_name}_trimmed.mp4")
-        ffmpeg_extract_subclip(input_path, 0, end_time, targetname=trimmed_path)
+        # The segment muxer writes every clip in one pass and lists them as it goes
+        clip_pattern = os.path.join(output_folder, f"{base_name.replace('%', '%%')}_part_%d.mp4")
+        segment_list_path = os.path.join(output_folder, f"{base_name}_segments.csv")
+        if mode == "exact":
+            codec_options = {'vcodec': 'libx264', 'acodec': 'aac', 'force_key_frames': f"expr:gte(t,n_forced*{clip_duration})"}
+        else:
+            codec_options = {'c': 'copy'}
+        (
+            ffmpeg
+            .input(input_path)
+            .output(clip_pattern, t=MAX_SOURCE_SECONDS, format='segment', segment_time=clip_duration,
+                    segment_start_number=1, reset_timestamps=1, segment_list=segment_list_path,
+                    segment_list_type='csv', **codec_options)
+            .run(overwrite_output=True, quiet=True)
+        )
+        clips = 0
+        with open(segment_list_path, newline='') as f:
+            for clip_file, start, end in csv.reader(f):
+                # Audio running a few packets past the cut can leave a sliver of a last clip
+                if float(end) - float(start) < MIN_CLIP_SECONDS:
+                    os.remove(os.path.join(output_folder, clip_file))
+                else:
+                    clips += 1
+        os.remove(segment_list_path)
         os.remove(input_path)
-        print(f"Trimmed video saved as: {trimmed_path}")
-        expected_clips = (end_time + clip_duration - 1) // clip_duration 
-        for start_time in range(0, end_time, clip_duration):
-            clip_path = os.path.join(output_folder, f"{base_name}_part_{start_time // clip_duration + 1}.mp4")
-            ffmpeg_extract_subclip(trimmed_path, start_time, start_time + clip_duration, targetname=clip_path)
-        
-        os.remove(trimmed_path)
-        print(f"Video split into {expected_clips} clips and saved to: {output_folder}")
+        print(f"Video split into {clips} clips and saved to: {output_folder}")
+        return clips
 
+    except ffmpeg.Error as e:
+        print(f"Error splitting video {input_path}: {e.stderr.decode(errors='ignore') if e.stderr else e}")
+        return 0
     except Exception as e:
         print(f"Error splitting video {input_path}: {e}")
+        return 0
+
+def find_duplicate(index, video_id, video_path):
+    # A video that can't be fingerprinted (unreadable, no duration) is kept
+    # and split as usual rather than failing the split stage
+    try:
+        hashes = video_fingerprint(video_path, samples=FINGERPRINT_FRAMES)
+    except ffmpeg.Error as e:
+        print(f"Could not fingerprint {video_path}: {e.stderr.decode(errors='ignore') if e.stderr else e}")
+        return None
+    except Exception as e:
+        print(f"Could not fingerprint {video_path}: {e}")
+        return None
+    return index.claim_fingerprint(video_id, hashes, DUPLICATE_SIMILARITY, FINGERPRINT_DISTANCE)
 
 def count_clips_in_folder(folder):
     return len([f for f in os.listdir(folder) if f.endswith('.mp4')])
 
-def main(api_key, keyword, source_folder):
+def main(api_key, keyword, source_folder, download_workers=DOWNLOAD_WORKERS, split_workers=SPLIT_WORKERS, target=TARGET_CLIPS):
     create_source_material_folder(source_folder)
-    processed_videos = set()  
-
-    while count_clips_in_folder(source_folder) < 200:
-        video_urls = search_youtube_videos(api_key, keyword)
-        for video_id, title in video_urls:
-            if video_id in processed_videos:
-                continue  
-            processed_videos.add(video_id)
-
-            output_file_name = f"{source_folder}/{title.replace(' ', '_')}.mp4"
-            if download_video(video_id, title, output_file_name):
-                print(f"Successfully downloaded video: {title}")
-                split_video_into_clips(output_file_name, source_folder)
-            else:
+    clips = ClipCounter(count_clips_in_folder(source_folder), target)
+    budget = ByteBudget(MAX_INFLIGHT_BYTES)
+    index = VideoIndex()
+
+    def candidates():
+        # Videos an earlier run found but never got to come first, then the
+        # search carries on from the page the last run stopped at
+        for video_id, title in index.pending(keyword):
+            if clips.reached():
+                return
+            yield video_id, title
+
+        while not clips.reached():
+            page_token, exhausted = index.search_position(keyword)
+            if exhausted:
+                print(f"Every search result for '{keyword}' has already been seen. Stopping; the search starts "
+                      f"over {SEARCH_REFRESH_DAYS:g} days after it ran out.")
+                return
+            try:
+                video_urls, next_page_token = search_youtube_videos(api_key, keyword, page_token=page_token)
+            except Exception as e:
+                if page_token is None:
+                    raise
+                print(f"Saved search position for '{keyword}' was rejected ({e}). Starting from the first page.")
+                index.reset_search_position(keyword)
+                continue
+            finally:
+                index.spend_quota(SEARCH_QUOTA_COST)
+            index.save_search_position(keyword, next_page_token)
+            for video_id, title in video_urls:
+                if clips.reached():
+                    return
+                if index.add(video_id, title, keyword):
+                    yield video_id, title
+
+    def download(video):
+        # Never raises either, for the same reason as split
+        video_id, title = video
+        if clips.reached():
+            return None
+        reserved = estimate_download_size(video_id, title)
+        budget.reserve(reserved)
+        # The video ID keeps two uploads with the same title from sharing a file
+        output_file_name = f"{source_folder}/{title.replace(' ', '_')}_{video_id}.mp4"
+        size = 0
+        try:
+            if not download_with_retry(video_id, title, output_file_name):
                 print(f"Failed to download video: {title}")
-            if count_clips_in_folder(source_folder) >= 200:
-                break
+                index.set_status(video_id, "download_failed")
+                return None
+            size = os.path.getsize(output_file_name) if os.path.exists(output_file_name) else 0
+        except Exception as e:
+            print(f"Error downloading video {title}: {e}")
+            index.set_status(video_id, "download_failed")
+            return None
+        finally:
+            # The real size replaces the estimate; a failed download frees it all
+            budget.adjust(reserved, size)
+        print(f"Successfully downloaded video: {title}")
+        return video_id, output_file_name, size
+
+    def split(downloaded):
+        # Must never raise: run_stages would stop splitting, the budget would
+        # never be released and downloads waiting on it would hang the run
+        if downloaded is None:
+            return
+        video_id, output_file_name, size = downloaded
+        try:
+            duplicate_of = find_duplicate(index, video_id, output_file_name)
+            if duplicate_of:
+                print(f"Dropping {output_file_name}: same footage as video {duplicate_of}")
+                os.remove(output_file_name)
+                index.set_status(video_id, "duplicate")
+                return
+            new_clips = split_video_into_clips(output_file_name, source_folder)
+            if not new_clips:
+                index.forget_fingerprint(video_id)
+            index.set_status(video_id, "split" if new_clips else "split_failed", new_clips)
+            total = clips.add(new_clips)
+            print(f"{total} of {target} clips")
+        except Exception as e:
+            print(f"Error processing {output_file_name}: {e}")
+            index.forget_fingerprint(video_id)
+            index.set_status(video_id, "split_failed")
+        finally:
+            budget.release(size)
+
+    run_stages(candidates(), [
+        ("download", download, download_workers),
+        ("split", split, split_workers),
+    ])
+
+    stats = index.stats()
+    print(f"Video index: {', '.join(f'{count} {status}' for status, count in sorted(stats['videos'].items()))}")
+    print(f"Search quota spent: {stats['quota_today']} units today, {stats['quota_total']} in total")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -0,0 +1,106 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from cache import CACHE_DIR
+from frames import fingerprint_similarity
+
+# Every video a search has returned, with its title and what happened to it,
+# plus where each keyword's search got to and the API quota spent, so later
+# runs pick up where the last one stopped instead of searching from page one.
+SEARCH_QUOTA_COST = 100  # YouTube Data API units per search.list call
+# A keyword whose results ran out is searched again from the first page
+# after this many days, so new uploads still get found
+SEARCH_REFRESH_DAYS = float(os.getenv("SEARCH_REFRESH_DAYS", "7"))
+
+class VideoIndex:
+    def __init__(self, name="youtube_index"):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(CACHE_DIR, f"{name}.sqlite"), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS videos "
+            "(video_id TEXT PRIMARY KEY, title TEXT NOT NULL, keyword TEXT NOT NULL, status TEXT NOT NULL, "
+            "clips INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS searches (keyword TEXT PRIMARY KEY, next_page_token TEXT, exhausted INTEGER NOT NULL, updated REAL NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS quota (day TEXT PRIMARY KEY, units INTEGER NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS fingerprints (video_id TEXT PRIMARY KEY, hashes TEXT NOT NULL)")
+        self.db.commit()
+
+    def add(self, video_id, title, keyword):
+        # False if the video is already known, whatever happened to it
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO videos (video_id, title, keyword, status, updated) VALUES (?, ?, ?, 'queued', ?)",
+                (video_id, title, keyword, time.time())
+            )
+            self.db.commit()
+            return cursor.rowcount == 1
+
+    def set_status(self, video_id, status, clips=0):
+        with self.lock:
+            self.db.execute("UPDATE videos SET status = ?, clips = ?, updated = ? WHERE video_id = ?", (status, clips, time.time(), video_id))
+            self.db.commit()
+
+    def claim_fingerprint(self, video_id, hashes, min_similarity=0.8, max_distance=10):
+        # Returns the ID of an already indexed video this one duplicates, or
+        # records its fingerprint and returns None. Check and insert happen
+        # under one lock so two copies split at once can't both get through.
+        with self.lock:
+            for other_id, other_hashes in self.db.execute("SELECT video_id, hashes FROM fingerprints WHERE video_id != ?", (video_id,)):
+                if fingerprint_similarity(hashes, json.loads(other_hashes), max_distance) >= min_similarity:
+                    return other_id
+            self.db.execute("INSERT OR REPLACE INTO fingerprints (video_id, hashes) VALUES (?, ?)", (video_id, json.dumps(hashes)))
+            self.db.commit()
+            return None
+
+    def forget_fingerprint(self, video_id):
+        # For a claimed video that produced no clips, so a later upload of
+        # the same footage isn't dropped as its duplicate
+        with self.lock:
+            self.db.execute("DELETE FROM fingerprints WHERE video_id = ?", (video_id,))
+            self.db.commit()
+
+    def pending(self, keyword):
+        # Found by an earlier search but never downloaded
+        with self.lock:
+            return self.db.execute("SELECT video_id, title FROM videos WHERE keyword = ? AND status = 'queued' ORDER BY updated", (keyword,)).fetchall()
+
+    def search_position(self, keyword, refresh_days=SEARCH_REFRESH_DAYS):
+        with self.lock:
+            row = self.db.execute("SELECT next_page_token, exhausted, updated FROM searches WHERE keyword = ?", (keyword,)).fetchone()
+        if row is None or (row[1] and row[2] < time.time() - refresh_days * 86400):
+            return None, False
+        return row[0], bool(row[1])
+
+    def save_search_position(self, keyword, next_page_token):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO searches (keyword, next_page_token, exhausted, updated) VALUES (?, ?, ?, ?)",
+                (keyword, next_page_token, int(next_page_token is None), time.time())
+            )
+            self.db.commit()
+
+    def reset_search_position(self, keyword):
+        with self.lock:
+            self.db.execute("DELETE FROM searches WHERE keyword = ?", (keyword,))
+            self.db.commit()
+
+    def spend_quota(self, units):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO quota (day, units) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET units = units + excluded.units",
+                (date.today().isoformat(), units)
+            )
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            statuses = dict(self.db.execute("SELECT status, COUNT(*) FROM videos GROUP BY status").fetchall())
+            today = self.db.execute("SELECT units FROM quota WHERE day = ?", (date.today().isoformat(),)).fetchone()
+            total = self.db.execute("SELECT COALESCE(SUM(units), 0) FROM quota").fetchone()[0]
+        return {"videos": statuses, "quota_today": today[0] if today else 0, "quota_total": total}
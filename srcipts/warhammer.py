@@ -1,18 +1,26 @@
 import os
 import random
+import re
 import ffmpeg
-from datetime import datetime
-from pydub import AudioSegment
-from pathlib import Path
-from openai import OpenAI
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from beats import BEAT_CHANNELS, BEAT_SAMPLE_RATE, index_beat, load_beat
+from clients import synthesize_speech
+from slideshow import create_enhanced_video
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_audio_duration(audio_path):
-    probe = ffmpeg.probe(audio_path)
-    duration = float(probe['format']['duration'])
-    return duration
+# Script narration is synthesised in chunks of at most TTS_CHUNK_CHARS
+# characters, TTS_WORKERS requests at a time
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "2000"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+
+# Background music mix: levels in dB, lengths in seconds
+MUSIC_GAIN = -21
+NARRATION_GAIN = 2
+FADE_SECONDS = 2
+TAIL_SECONDS = 10
+MIX_CHUNK_SECONDS = 10
 
 def cleanup_folder(folder, exclude=[]):
     if os.path.exists(folder):
@@ -23,7 +31,46 @@ def cleanup_folder(folder, exclude=[]):
     else:
         os.makedirs(folder)
 
-def generate_tts_for_script(script_path, tts_output_folder):
+def split_script(text, max_chars=TTS_CHUNK_CHARS):
+    # Chunks end on sentence boundaries and never cross a paragraph, so an
+    # edit to one paragraph leaves every other chunk (and its cached audio)
+    # unchanged. A single sentence longer than max_chars is split on spaces.
+    chunks = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        current = ""
+        for sentence in re.split(r'(?<=[.!?])\s+', paragraph.strip()):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+def concat_audio_copy(part_paths, output_path):
+    filelist_path = f"{output_path}.txt"
+    with open(filelist_path, 'w') as f:
+        for part_path in part_paths:
+            f.write(f"file '{os.path.abspath(part_path)}'\n")
+    try:
+        (
+            ffmpeg
+            .input(filelist_path, format='concat', safe=0)
+            .output(output_path, acodec='copy')
+            .run(overwrite_output=True, quiet=True)
+        )
+    finally:
+        os.remove(filelist_path)
+
+def generate_tts_for_script(script_path, tts_output_folder, workers=TTS_WORKERS):
     tts_output_path = os.path.join(tts_output_folder, "script_tts.mp3")
     if os.path.exists(tts_output_path):
         print(f"TTS audio already exists at {tts_output_path}. Skipping TTS generation.")
@@ -34,30 +81,59 @@ def generate_tts_for_script(script_path, tts_output_folder):
     with open(script_path, 'r') as file:
         script_content = file.read()
     
-    tts_parts = []
-    part_size = 2000  
-    for i in range(0, len(script_content), part_size):
-        part_content = script_content[i:i+part_size]
-        response = client.audio.speech.create(
-            model="tts-1-hd",
-            voice="onyx",
-            input=part_content
-        )
-        part_path = os.path.join(tts_output_folder, f"script_tts_part_{i//part_size}.mp3")
-        response.stream_to_file(Path(part_path))
-        tts_parts.append(part_path)
-        print(f"Generated TTS for part {i//part_size} and saved to {part_path}")
-    
-    combined_tts_audio = AudioSegment.empty()
-    for part in tts_parts:
-        part_audio = AudioSegment.from_file(part)
-        combined_tts_audio += part_audio
+    chunks = split_script(script_content)
+    tts_parts = [os.path.join(tts_output_folder, f"script_tts_part_{i}.mp3") for i in range(len(chunks))]
+
+    def synthesize_part(i):
+        # Cached per chunk, so only edited chunks go back to the API
+        synthesize_speech(chunks[i], tts_parts[i], model="tts-1-hd", voice="onyx")
+        print(f"Generated TTS for part {i} and saved to {tts_parts[i]}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(synthesize_part, range(len(chunks))))
     
-    combined_tts_audio.export(tts_output_path, format="mp3")
+    concat_audio_copy(tts_parts, tts_output_path)
     print(f"Generated TTS audio and saved to {tts_output_path}")
     
     return tts_output_path
 
+def db_to_gain(db):
+    return 10 ** (db / 20)
+
+def iter_music_chunks(music_folder, beat_files, chunk_frames):
+    # Yields the playlist as fixed-size PCM chunks. Each track is decoded (and
+    # memory-mapped) only when the previous one runs out; after the last
+    # track, silence.
+    pending = []
+    pending_frames = 0
+    for beat_file in beat_files:
+        samples = load_beat(index_beat(os.path.join(music_folder, beat_file)))
+        position = 0
+        while position < len(samples):
+            take = min(chunk_frames - pending_frames, len(samples) - position)
+            pending.append(samples[position:position + take])
+            pending_frames += take
+            position += take
+            if pending_frames == chunk_frames:
+                yield np.concatenate(pending)
+                pending, pending_frames = [], 0
+    if pending:
+        pending.append(np.zeros((chunk_frames - pending_frames, BEAT_CHANNELS), dtype=np.int16))
+        yield np.concatenate(pending)
+    while True:
+        yield np.zeros((chunk_frames, BEAT_CHANNELS), dtype=np.int16)
+
+def read_pcm(stream, frames):
+    data = stream.read(frames * 2 * BEAT_CHANNELS)
+    return np.frombuffer(data, dtype=np.int16).reshape(-1, BEAT_CHANNELS)
+
+def fade_envelope(position, frames, total_frames, fade_frames):
+    index = np.arange(position, position + frames, dtype=np.float32)
+    envelope = np.minimum(index / fade_frames, 1)
+    if total_frames is not None:
+        envelope *= np.clip((total_frames - index) / fade_frames, 0, 1)
+    return envelope
+
 def combine_music_and_tts(tts_path, music_folder, output_folder):
     final_audio_path = os.path.join(output_folder, "final_combined_audio.mp3")
     if os.path.exists(final_audio_path):
@@ -70,99 +146,58 @@ def combine_music_and_tts(tts_path, music_folder, output_folder):
     if not beat_files:
         print("No beat files found in the directory.")
         return False
-    
-    combined_audio = AudioSegment.silent(duration=0)
-    for beat_file in beat_files:
-        beat_path = os.path.join(music_folder, beat_file)
-        beat_audio = AudioSegment.from_wav(beat_path)
-        combined_audio += beat_audio
-    
-    tts_audio = AudioSegment.from_file(tts_path)
-    silence = AudioSegment.silent(duration=10 * 1000)  # 10 seconds of silence
-    tts_audio = tts_audio + silence
-    tts_duration_ms = len(tts_audio)
-
-    combined_audio = combined_audio[:tts_duration_ms]
-    combined_audio = combined_audio - 21  
-    tts_audio = tts_audio + 2     
-    final_combined = combined_audio.overlay(tts_audio)
-    final_combined = final_combined.fade_in(2000).fade_out(2000)  
-    final_combined.export(final_audio_path, format="mp3")
-    
-    return final_audio_path
 
-def create_video_segment(image_path, output_path, duration=30):
-    (
+    # Narration and music are mixed chunk by chunk and piped straight into the
+    # mp3 encoder, so memory stays flat however long the narration is. The
+    # narration is followed by TAIL_SECONDS of music only, which is also where
+    # the fade out lands.
+    chunk_frames = MIX_CHUNK_SECONDS * BEAT_SAMPLE_RATE
+    fade_frames = FADE_SECONDS * BEAT_SAMPLE_RATE
+    music_chunks = iter_music_chunks(music_folder, beat_files, chunk_frames)
+    temp_path = f"{final_audio_path}.{os.getpid()}.tmp.mp3"
+    tts_process = (
         ffmpeg
-        .input(image_path, loop=1, t=duration)
-        .filter('zoompan', z='min(zoom+0.00075,1.5)', d=duration * 25 + 100, s='1280x720')
-        .filter('format', pix_fmts='yuv420p')
-        .filter('fade', t='in', st=0, d=1)
-        .filter('fade', t='out', st=duration-1, d=1)
-        .output(output_path, vcodec='libx264', pix_fmt='yuv420p', r=25, t=duration)
-        .run(overwrite_output=True)
+        .input(tts_path)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=BEAT_CHANNELS, ar=BEAT_SAMPLE_RATE)
+        .run_async(pipe_stdout=True, quiet=True)
+    )
+    output_process = (
+        ffmpeg
+        .input('pipe:', format='s16le', ac=BEAT_CHANNELS, ar=BEAT_SAMPLE_RATE)
+        .output(temp_path, acodec='libmp3lame')
+        .overwrite_output()
+        .run_async(pipe_stdin=True, quiet=True)
     )
 
-def concatenate_segments(segment_paths, output_path, audio_path=None):
-    inputs = [ffmpeg.input(segment) for segment in segment_paths]
-    concat_filter = ffmpeg.concat(*inputs, v=1, a=0).node
-    video = concat_filter[0]
-
-    if audio_path:
-        audio = ffmpeg.input(audio_path)
-        audio_duration = get_audio_duration(audio_path)
-        final_audio_duration = audio_duration + 10  # Add 10 seconds of silence at the end
-        audio = (
-            audio
-            .filter('atrim', end=audio_duration)
-            .filter('apad', pad_len=10*44100)  # Assuming audio sample rate is 44100 Hz
-            .filter('atrim', end=final_audio_duration)
-        )
-        output = ffmpeg.output(video, audio, output_path, vcodec='libx264', pix_fmt='yuv420p', acodec='aac')
-    else:
-        output = ffmpeg.output(video, output_path, vcodec='libx264', pix_fmt='yuv420p')
-
-    output.run(overwrite_output=True)
-
-def create_enhanced_video(image_folder, output_folder, audio_file=None):
-    temp_video_folder = os.path.join(output_folder, "temp_segments")
-    if not os.path.exists(temp_video_folder):
-        os.makedirs(temp_video_folder)
-
-    final_output_path = os.path.join(output_folder, f"final_video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
-
-    image_files = [os.path.join(image_folder, file) for file in os.listdir(image_folder) if file.endswith(('.png', '.jpg', '.jpeg'))]
-
-    if not image_files:
-        print("No image files found in the specified folder. Exiting...")
-        return
-
-    if audio_file:
-        video_duration = get_audio_duration(audio_file) + 10  # Audio duration plus 10 seconds of silence
-    else:
-        video_duration = 60  # Default video duration if no audio file is provided
-
-    # Calculate the number of images needed and the display duration for each
-    image_display_time = 30  # Display each image for 30 seconds
-    num_images_needed = int(video_duration // image_display_time)
-    remaining_time = video_duration % image_display_time
-
-    extended_image_files = image_files * (num_images_needed // len(image_files) + 1)
-    selected_images = extended_image_files[:num_images_needed]
+    position = 0
+    total_frames = None
+    try:
+        while total_frames is None or position < total_frames:
+            narration = read_pcm(tts_process.stdout, chunk_frames) if total_frames is None else None
+            if narration is not None and len(narration) < chunk_frames:
+                total_frames = position + len(narration) + TAIL_SECONDS * BEAT_SAMPLE_RATE
+            frames = chunk_frames if total_frames is None else min(chunk_frames, total_frames - position)
 
-    segment_paths = []
-    for i, image in enumerate(selected_images):
-        segment_path = os.path.join(temp_video_folder, f"segment_{i}.mp4")
-        create_video_segment(image, segment_path, duration=image_display_time)
-        segment_paths.append(segment_path)
+            mixed = next(music_chunks)[:frames].astype(np.float32) * db_to_gain(MUSIC_GAIN)
+            if narration is not None:
+                mixed[:len(narration)] += narration.astype(np.float32) * db_to_gain(NARRATION_GAIN)
+            mixed *= fade_envelope(position, frames, total_frames, fade_frames)[:, None]
+            output_process.stdin.write(np.clip(mixed, -32768, 32767).astype(np.int16).tobytes())
+            position += frames
+    finally:
+        tts_process.stdout.close()
+        tts_process.wait()
+        output_process.stdin.close()
+        output_process.wait()
 
-    if remaining_time > 0:
-        last_segment_path = os.path.join(temp_video_folder, f"segment_{num_images_needed}.mp4")
-        create_video_segment(selected_images[-1], last_segment_path, duration=remaining_time)
-        segment_paths.append(last_segment_path)
+    if tts_process.returncode != 0 or output_process.returncode != 0:
+        print("ffmpeg failed while mixing the narration and music.")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
 
-    concatenate_segments(segment_paths, final_output_path, audio_file)
-    print(f"Final video saved to {final_output_path}")
+    os.replace(temp_path, final_audio_path)
+    return final_audio_path
 
 def process_warhammer40k_content():
     script_dir = os.path.dirname(os.path.abspath(__file__))